@@ -18,6 +18,66 @@ function! gdb#layout#update_buffer(bufnr, content)
   call setbufvar(a:bufnr, '&ma', 0)
 endfun
 
+" Takes a list of [bufnr, hunks] pairs, where each hunk is [start, end, lines]:
+" lines start+1 to end of the buffer get replaced by `lines`. An `end` < 0
+" replaces the whole buffer. Hunks are sorted by `start`, and don't overlap.
+" Without bufload() (Vim < 8.1.1021), the server only sends whole buffers.
+function! gdb#layout#update_buffers(updates)
+  for [bnr, hunks] in a:updates
+    if !exists('*bufload')
+      call gdb#layout#update_buffer(bnr, hunks[0][2])
+      continue
+    endif
+    if !bufloaded(bnr)
+      call bufload(bnr)
+    endif
+    call setbufvar(bnr, '&ma', 1)
+    for [start, end, lines] in reverse(copy(hunks))
+      if end < 0
+        silent call deletebufline(bnr, 1, '$')
+        call setbufline(bnr, 1, lines)
+        continue
+      endif
+      let nrep = min([end - start, len(lines)])
+      if nrep > 0
+        call setbufline(bnr, start + 1, lines[: nrep - 1])
+      endif
+      if end - start > nrep
+        silent call deletebufline(bnr, start + nrep + 1, end)
+      elseif len(lines) > nrep
+        call appendbufline(bnr, start + nrep, lines[nrep :])
+      endif
+    endfor
+    call setbufvar(bnr, '&ma', 0)
+  endfor
+endfun
+
+" Appends `lines` to the logs buffer, deleting the oldest lines beyond
+" `max_lines` (if > 0), and scrolls the windows showing it to the bottom.
+function! gdb#layout#logs_append(bufnr, lines, max_lines)
+  if !bufloaded(a:bufnr)
+    call bufload(a:bufnr)
+  endif
+  if has('patch-8.2.0019')
+    let nlines = getbufinfo(a:bufnr)[0].linecount
+  else
+    let nlines = len(getbufline(a:bufnr, 1, '$'))
+  endif
+  call setbufvar(a:bufnr, '&ma', 1)
+  if nlines == 1 && getbufline(a:bufnr, 1) == ['']
+    call setbufline(a:bufnr, 1, a:lines)
+    let nlines = len(a:lines)
+  else
+    call appendbufline(a:bufnr, '$', a:lines)
+    let nlines += len(a:lines)
+  endif
+  if a:max_lines > 0 && nlines > a:max_lines
+    silent call deletebufline(a:bufnr, 1, nlines - a:max_lines)
+  endif
+  call setbufvar(a:bufnr, '&ma', 0)
+  call gdb#util#buffer_do(a:bufnr, 'normal! G')
+endfun
+
 " Given the regex, extracts the match from the current line in the buffer.
 " If there's no match, the fallback_str is returned.
 function! s:matchstr_with_fallback(line, regex, fallback_str)
@@ -51,6 +111,35 @@ function! gdb#layout#breakpoint_retrieve()
   return frame_id
 endfun
 
+" Tells the server which debugger panes are displayed in the current tab, so
+" that the hidden ones aren't refreshed.
+function! s:report_visible(...)
+  let s:report_pending = 0
+  if !exists('s:buffer_map') || !exists('g:gdb#_job')
+    return
+  endif
+  let bufnrs = tabpagebuflist()
+  let visible = []
+  for [bname, bnr] in items(s:buffer_map)
+    if index(bufnrs, bnr) >= 0
+      call add(visible, bname)
+    endif
+  endfor
+  call sort(visible)
+  if visible != get(s:, 'last_visible', [])
+    let s:last_visible = visible
+    call gdb#remote#__notify('visible', visible)
+  endif
+endfun
+
+" Window layout is settled only after the autocommands fire; report later.
+function! s:schedule_report()
+  if !get(s:, 'report_pending', 0)
+    let s:report_pending = 1
+    call timer_start(0, function('s:report_visible'))
+  endif
+endfun
+
 function! gdb#layout#init_buffers()
   let s:buffers = [ 'backtrace', 'breakpoints', 'disassembly',
                   \ 'locals', 'logs', 'registers', 'threads' ]
@@ -66,9 +155,51 @@ function! gdb#layout#init_buffers()
     let s:buffer_map[bname] = bnr
   endfor
   exe 'silent b ' . u_bnr
+  let s:last_visible = []
+  augroup gdb_layout_visible
+    au!
+    au BufWinEnter,BufWinLeave \[gdb\]* call s:schedule_report()
+    au TabEnter * call s:schedule_report()
+  augroup END
   return s:buffer_map
 endfun
 
+" Asks for more instructions when the cursor reaches an edge of the disassembly.
+function! s:disassembly_scroll()
+  let lnum = line('.')
+  if lnum == get(b:, 'gdb_last_lnum', 1)
+    return
+  endif
+  let b:gdb_last_lnum = lnum
+  if lnum == 1
+    call gdb#remote#__notify('disassemble_more', 'up')
+  elseif lnum == line('$')
+    call gdb#remote#__notify('disassemble_more', 'down')
+  endif
+endfun
+
+" Asks for the next frames when the cursor reaches the end of the backtrace.
+function! s:backtrace_scroll()
+  let lnum = line('.')
+  if lnum == get(b:, 'gdb_last_lnum', 1)
+    return
+  endif
+  let b:gdb_last_lnum = lnum
+  if lnum == line('$') && getline(lnum) =~ '^\s*\.\.\. \d\+'
+    call gdb#remote#__notify('backtrace_more')
+  endif
+endfun
+
+" Tells the server which threads are in view, so that their details are shown.
+function! s:threads_scroll()
+  let first = line('w0')
+  let view = [first, first + winheight(0) - 1]
+  if view != get(b:, 'gdb_threads_view', [])
+    let b:gdb_threads_view = view
+    call gdb#remote#__notify('threads_view', first, view[1])
+  endif
+endfun
+
 function! gdb#layout#init_window(width, split, bnr)
   exe 'belowright ' . a:width . a:split . '+b' . a:bnr
   set nonu
@@ -81,14 +212,34 @@ function! gdb#layout#init_window(width, split, bnr)
     if s:buffer_map['backtrace'] == a:bnr
       nnoremap <silent> <buffer> a :call gdb#remote#__notify("btswitch")<CR>
       nnoremap <silent> <buffer> t :drop [gdb]threads<CR>
+      augroup gdb_layout_backtrace
+        au! * <buffer>
+        au CursorMoved <buffer> call s:backtrace_scroll()
+      augroup END
     else
       nnoremap <silent> <buffer> a :drop [gdb]backtrace<CR>
+      augroup gdb_layout_threads
+        au! * <buffer>
+        au CursorMoved,WinEnter <buffer> call s:threads_scroll()
+        if exists('##WinScrolled')
+          au WinScrolled <buffer> call s:threads_scroll()
+        endif
+      augroup END
+      call s:threads_scroll()
     endif
     nnoremap <silent> <buffer> <CR>
             \ :call gdb#remote#__notify("select_thread_and_frame", gdb#layout#backtrace_retrieve())<CR>
   elseif s:buffer_map['breakpoints'] == a:bnr
     nnoremap <silent> <buffer> <nowait> x
             \ :call gdb#remote#__notify("breakdelete", gdb#layout#breakpoint_retrieve())<CR>
+  elseif s:buffer_map['locals'] == a:bnr
+    nnoremap <silent> <buffer> <CR> :call gdb#remote#__notify("var_toggle", line('.'))<CR>
+    nnoremap <silent> <buffer> <nowait> x :call gdb#remote#__notify("unwatch", line('.'))<CR>
+  elseif s:buffer_map['disassembly'] == a:bnr
+    augroup gdb_layout_disassembly
+      au! * <buffer>
+      au CursorMoved <buffer> call s:disassembly_scroll()
+    augroup END
   endif
 endfun
 
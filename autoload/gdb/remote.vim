@@ -7,19 +7,76 @@ function! gdb#remote#__notify(event, ...) abort
 endfun
 
 function! gdb#remote#init()
-  if exists('g:gdb#_job') && job_status(g:gdb#_job) == 'run'
+  if exists('g:gdb#_job') && ch_status(g:gdb#_job) == 'open'
     throw 'GDB: job already running'
   endif
-  let cmd = ['python3', g:gdb#_server]
-  let g:gdb#_job = job_start(cmd, { 'in_mode': 'json',
-                                  \ 'out_mode': 'json',
-                                  \ 'err_mode': 'nl',
-                                  \ 'err_io': 'buffer',
-                                  \ 'err_name': '[gdb]logs'})
-  au VimLeavePre * call gdb#remote#__notify('exit')
+  let cmd = ['python3', g:gdb#_server,
+            \ '--log-file', expand(get(g:, 'gdb#log#file', '/tmp/gdb.vim.log')),
+            \ '--log-mode', get(g:, 'gdb#log#mode', 'ring'),
+            \ '--debug', get(g:, 'gdb#log#debug', '')]
+  let ch = get(g:, 'gdb#daemon#enable', 0) && has('patch-8.2.4684') ?
+            \ s:daemon_connect(cmd) : 0
+  if type(ch) == v:t_channel
+    let g:gdb#_job = ch
+    " the daemon runs in the directory of the Vim instance that started it
+    call ch_sendexpr(ch, ['cwd', getcwd()])
+  else
+    let g:gdb#_job = job_start(cmd, { 'in_mode': 'json',
+                                    \ 'out_mode': 'json',
+                                    \ 'err_mode': 'nl',
+                                    \ 'err_io': 'buffer',
+                                    \ 'err_name': '[gdb]logs'})
+  endif
+  augroup gdb_remote
+    au!
+    au VimLeavePre * call s:notify_if_open('exit')
+    au BufWipeout * call s:notify_if_open('bufwipe', +expand('<abuf>'))
+    au BufFilePost * call s:notify_if_open('bufwipe', +expand('<abuf>'))
+  augroup END
   call gdb#remote#define_commands()
 endfun
 
+" Like gdb#remote#__notify, for the autocommands, which fire for every buffer
+" even once the server is gone.
+function! s:notify_if_open(event, ...)
+  if exists('g:gdb#_job') && ch_status(g:gdb#_job) ==# 'open'
+    call call('gdb#remote#__notify', [a:event] + a:000)
+  endif
+endfun
+
+" Opens a channel to the server daemon of the user, which is started first if it
+" is not running. Returns 0 if that failed, or if the socket is not safe to use.
+function! s:daemon_connect(cmd)
+  let sock = expand(get(g:, 'gdb#daemon#socket', (exists('$XDG_RUNTIME_DIR') ?
+                        \ $XDG_RUNTIME_DIR : '~/.cache') . '/gdb.vim/server.sock'))
+  let dir = fnamemodify(sock, ':h')
+  if isdirectory(dir) && getfperm(dir) !=# 'rwx------'
+    return 0  " others could pose as the daemon
+  endif
+  let ch = s:daemon_open(sock)
+  if type(ch) == v:t_channel
+    return ch
+  endif
+  call job_start(a:cmd + ['--daemon', sock, '--idle-timeout',
+                        \ string(get(g:, 'gdb#daemon#idle_timeout', 3600))],
+               \ {'in_io': 'null', 'out_io': 'null', 'err_io': 'null', 'stoponexit': ''})
+  let waited = 0
+  while type(ch) != v:t_channel && waited < 3000
+    sleep 20m
+    let waited += 20
+    let ch = s:daemon_open(sock)
+  endwhile
+  return ch
+endfun
+
+" Returns an open channel to the daemon listening on a:sock, or 0 if there is
+" none ('waittime' is not supported for Unix sockets).
+function! s:daemon_open(sock)
+  let ch = 0
+  silent! let ch = ch_open('unix:' . a:sock, {'mode': 'json'})
+  return type(ch) == v:t_channel && ch_status(ch) ==# 'open' ? ch : 0
+endfun
+
 let s:ctrlchars = { 'BS': "\b",
                   \ 'CR': "\r",
                   \ 'EOT': "\x04",
@@ -48,6 +105,23 @@ function! gdb#remote#stdin_prompt(...)
   call gdb#remote#__notify("stdin", strin)
 endfun
 
+" Shows the timing statistics of the server in a scratch buffer; given a file
+" name, writes them there as JSON instead (or forgets them, given 'reset').
+function! gdb#remote#stats(...)
+  if a:0
+    call gdb#remote#__notify('stats', a:1)
+    return
+  endif
+  let bnr = bufnr('[gdb]stats', 1)
+  call setbufvar(bnr, '&bt', 'nofile')
+  call setbufvar(bnr, '&swf', 0)
+  call setbufvar(bnr, '&ma', 0)
+  if bufwinnr(bnr) < 0
+    exe 'botright sbuffer ' . bnr
+  endif
+  call gdb#remote#__notify('stats', bnr)
+endfun
+
 function! gdb#remote#get_modes()
   if exists('g:gdb#_channel_id')
     return rpcrequest(g:gdb#_channel_id, 'get_modes')
@@ -58,11 +132,17 @@ endfun
 
 function! gdb#remote#define_commands()
   command!           GGrefresh call gdb#remote#__notify("refresh")
+  command!           GGinterrupt call gdb#remote#__notify("interrupt")
+  command! -nargs=? -complete=file
+          \          GGlogdump call gdb#remote#__notify("logdump", <f-args>)
+  command! -nargs=? -complete=file
+          \          GGstats   call gdb#remote#stats(<f-args>)
 
   command! -nargs=1       -complete=customlist,gdb#session#complete
           \          GGmode    call gdb#remote#__notify("mode", <f-args>)
 
   command! -nargs=*  GG        call gdb#remote#__notify("exec", <f-args>)
+  command! -nargs=+  GGwatch   call gdb#remote#__notify("watch", <q-args>)
   command! -nargs=?       -complete=customlist,<SID>stdincompl
           \          GGstdin   call gdb#remote#stdin_prompt(<f-args>)
   command! -nargs=+       -complete=customlist,gdb#session#complete
@@ -41,7 +41,7 @@ function! gdb#session#complete(ArgLead, CmdLine, CursorPos)
   endif
   if toknum == 2
     let subcmds = ['new', 'load']
-    if exists('g:gdb#_channel_id')
+    if exists('g:gdb#_job')
       call extend(subcmds, ['bp-save', 'bp-set', 'reload', 'show'])
     endif
     return s:complete_prefix(subcmds, a:ArgLead)
@@ -17,3 +17,27 @@ function! gdb#util#buffer_do(bufnr, cmd)
   endfor
   exe old_wnr . "wincmd w"
 endfun
+
+" Returns a copy of `defaults`, with each value overridden by the variable
+" g:gdb#{key}, if it exists.
+function! gdb#util#options(defaults)
+  let opts = {}
+  for [key, val] in items(a:defaults)
+    let opts[key] = get(g:, 'gdb#' . key, val)
+  endfor
+  return opts
+endfun
+
+" Executes a batch of messages queued by the server: each item is either
+" ['ex', {command}], ['call', {func}, {args}] or ['expr', {expr}].
+function! gdb#util#batch(items)
+  for item in a:items
+    if item[0] == 'ex'
+      exe item[1]
+    elseif item[0] == 'call'
+      call call(item[1], item[2])
+    else
+      call eval(item[1])
+    endif
+  endfor
+endfun
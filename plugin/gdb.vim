@@ -26,6 +26,7 @@ let s:bp_symbol = get(g:, 'gdb#sign#bp_symbol', 'B>')
 let s:pc_symbol = get(g:, 'gdb#sign#pc_symbol', '->')
 
 highlight default link GGBreakpointSign Type
+highlight default link GGPendingBreakpointSign NonText
 highlight default link GGUnselectedPCSign NonText
 highlight default link GGUnselectedPCLine DiffChange
 highlight default link GGSelectedPCSign Debug
@@ -33,6 +34,8 @@ highlight default link GGSelectedPCLine DiffText
 
 execute 'sign define llsign_bpres text=' . s:bp_symbol .
     \ ' texthl=GGBreakpointSign linehl=GGBreakpointLine'
+execute 'sign define llsign_bppend text=' . s:bp_symbol .
+    \ ' texthl=GGPendingBreakpointSign'
 execute 'sign define llsign_pcsel text=' . s:pc_symbol .
     \ ' texthl=GGSelectedPCSign linehl=GGSelectedPCLine'
 execute 'sign define llsign_pcunsel text=' . s:pc_symbol .
@@ -1,8 +1,10 @@
 from __future__ import (absolute_import, division, print_function)
 
-from select import select
+from os import chdir, path
+import asyncio
 import logging
 
+from . import ring_log
 from .controller import Controller  # NOQA
 from .vim_x import VimX  # NOQA
 
@@ -10,55 +12,146 @@ __metaclass__ = type  # pylint: disable=invalid-name
 
 
 class Middleman:
+    """ Serves the requests from Vim one at a time, except for the urgent ones,
+        which are handled right away, even while another request is being served.
+    """
+    urgent = ('exit', 'stdin', 'interrupt', 'stats', 'logdump', 'cwd')
 
     def __init__(self, vimx):
         self.ctrl = Controller(vimx)
         self.vimx = vimx
         self.logger = logging.getLogger(__name__)
+        self.requests = None  # queue of the requests waiting to be served
+        self.current = None  # task serving the current request
 
-    def loop(self):
+    async def loop(self):
+        """ Read requests from Vim until it closes the channel. """
+        self.vimx.start(asyncio.get_event_loop())
+        self.requests = asyncio.Queue()
+        self.ctrl.lock = asyncio.Lock()
+        worker = asyncio.ensure_future(self.serve())
+        try:
+            while True:
+                msg = await self.vimx.events.get()
+                if msg is None:
+                    break
+                if msg[0] in self.urgent:
+                    self._handle_urgent(msg)
+                else:
+                    self.requests.put_nowait(msg)
+        finally:
+            worker.cancel()
+            if self.ctrl.dbg is not None:
+                self.ctrl.dbg_stop()
+            self.ctrl.standby_stop()
+
+    async def serve(self):
+        """ Serve the queued requests, in order. """
         while True:
-            rlist = [self.vimx.ch_in]
+            msg = await self.requests.get()
+            async with self.ctrl.lock:
+                self.current = asyncio.ensure_future(self._handle(msg))
+                await asyncio.wait([self.current])
+                task, self.current = self.current, None
+            if task.cancelled():
+                self.ctrl.buffers.logs_append('Interrupted: {}\n'.format(msg[0]), u'\u2717')
+            elif task.exception() is not None:
+                self.logger.error('Error while serving %s', msg, exc_info=task.exception())
+                self.vimx.log('Error while serving "{}"; see {}'.format(
+                    msg[0], ring_log.log_file() or 'the log of the server'))
+
+    def _handle_urgent(self, msg):
+        head = msg[0]
+        args = msg[1:]
+        if head == 'stdin':
+            assert(len(args) == 1)
             if self.ctrl.dbg is not None:
-                rlist += self.ctrl.dbg.read_list
-            ready, _, _ = select(rlist, [], [], 2)
-            for ev in ready:
-                if ev == self.vimx.ch_in:
-                    msg = self.vimx.wait()
-                    self._handle(msg)
-                else:
-                    self.dbg.poke()
+                self.ctrl.put_stdin(args[0])
+        elif head == 'interrupt':
+            assert(len(args) == 0)
+            if self.ctrl.dbg is not None:
+                self.ctrl.dbg_interrupt()
+            if self.current is not None:
+                self.current.cancel()
+        elif head == 'stats':  # e.g. while a slow command is being served
+            assert(len(args) == 1)
+            self.ctrl.do_stats(args[0])
+        elif head == 'logdump':
+            assert(len(args) <= 1)
+            try:
+                filename = ring_log.dump(*[path.expanduser(arg) for arg in args])
+            except (IOError, OSError) as e:
+                self.vimx.log('Cannot write the log: {}'.format(e), 2)
+                return
+            if filename is None:
+                self.vimx.log('The log is written to its file as it goes')
+            else:
+                self.vimx.log('Log written to {}'.format(filename), 0)
+        elif head == 'cwd':  # sent first by a Vim instance attaching to the daemon
+            assert(len(args) == 1)
+            try:
+                chdir(args[0])
+            except OSError as e:
+                self.vimx.log('Cannot change directory: {}'.format(e))
+        elif head == 'exit':
+            assert(len(args) == 0)
+            while not self.requests.empty():
+                self.requests.get_nowait()
+            if self.current is not None:
+                self.current.cancel()
+            if self.ctrl.dbg is not None:
+                self.ctrl.session.save_breakpoints()
+                self.ctrl.dbg_stop()
+            self.ctrl.standby_stop()
 
-    def _handle(self, msg):
+    async def _handle(self, msg):
         head = msg[0]
         args = msg[1:]
         if head == 'session':
-            self.ctrl.session.handle(*args)
+            await self.ctrl.session.handle(*args)
         elif head == 'mode':
             assert(len(args) == 1)
-            self.ctrl.session.mode_setup(args[0])
+            await self.ctrl.session.mode_setup(args[0])
         elif head == 'exec':
-            self.ctrl.execute(' '.join(args))
+            await self.ctrl.execute(' '.join(args))
             if args[0] == 'help':
                 self.ctrl.vimx.command('drop [gdb]logs')
-        elif head == 'stdin':
-            assert(len(args) == 1)
-            self.ctrl.put_stdin(args[0])
-        elif head == 'exit':
-            assert(len(args) == 0)
-            self.ctrl.dbg_stop()
         elif head == 'breakswitch':
             bufnr, line = args
-            self.ctrl.do_breakswitch(bufnr, line)
+            await self.ctrl.do_breakswitch(bufnr, line)
         elif head == 'breakdelete':
             assert(len(args) == 1)
-            self.ctrl.do_breakdelete(bp_id)
+            await self.ctrl.do_breakdelete(args[0])
+        elif head == 'visible':
+            assert(len(args) == 1)
+            await self.ctrl.buffers.set_visible(args[0])
+        elif head == 'disassemble_more':
+            assert(len(args) == 1)
+            await self.ctrl.buffers.disassembly_extend(args[0])
+        elif head == 'select_thread_and_frame':
+            assert(len(args) == 1)
+            await self.ctrl.do_select_thread_and_frame(*args[0])
+        elif head == 'backtrace_more':
+            assert(len(args) == 0)
+            await self.ctrl.buffers.backtrace_more()
+        elif head == 'threads_view':
+            assert(len(args) == 2)
+            await self.ctrl.buffers.threads_view(*args)
+        elif head == 'var_toggle':
+            assert(len(args) == 1)
+            await self.ctrl.buffers.variables_toggle(args[0])
+        elif head == 'watch':
+            assert(len(args) == 1)
+            await self.ctrl.buffers.watch_add(args[0])
+        elif head == 'unwatch':
+            assert(len(args) == 1)
+            await self.ctrl.buffers.watch_remove(args[0])
+        elif head == 'bufwipe':
+            assert(len(args) == 1)
+            self.vimx.buffer_forget(args[0])
         elif head == 'refresh':
             assert(len(args) == 0)
-            self.ctrl.update_buffers()
-
-    def _select_thread_and_frame(self, thread, frame):
-        pass
+            self.ctrl.refresher.request()
 
     def _btswitch(self):
         pass
@@ -0,0 +1,100 @@
+# Backtrace pane: the frames of the selected thread, fetched a page at a time,
+# and cached until the inferior runs again.
+
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+
+from .records import Frame
+from .renderer import frame_line
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class Backtrace:
+    page_size = 64  # frames fetched at a time
+    depth_limit = 100000  # frames counted at most by -stack-info-depth
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.logger = logging.getLogger(__name__)
+        self.generation = None  # stop the cached frames belong to
+        self.frames = {}  # maps thread id -> list of Frame records, from the innermost one
+        self.depths = {}  # maps thread id -> number of frames (at most depth_limit)
+        self.thread_id = None  # thread shown in the pane
+        self.level = 0  # selected frame
+
+    def clear(self):
+        """ Forget everything, e.g. when gdb is restarted. """
+        self.generation = None
+        self.frames = {}
+        self.depths = {}
+        self.thread_id = None
+        self.level = 0
+
+    def check_generation(self):
+        """ Drop the cached frames if the inferior stopped since they were fetched. """
+        if self.generation != self.ctrl.state.stops:
+            self.generation = self.ctrl.state.stops
+            self.frames = {}
+            self.depths = {}
+
+    async def lines(self, thread_id, level):
+        """ Returns the lines of the pane for the selected thread and frame. Only the
+            first page of frames is fetched, unless cached already.
+        """
+        self.check_generation()
+        self.thread_id = thread_id
+        self.level = level
+        if thread_id is None:
+            return []
+        if thread_id not in self.frames:
+            await self.fetch(thread_id)
+        return self.render()
+
+    async def more(self):
+        """ Fetch the next page of frames, and return the new lines of the pane. """
+        self.check_generation()
+        tid = self.thread_id
+        if tid is None or len(self.frames.get(tid, [])) >= self.depths.get(tid, 0):
+            return None
+        await self.fetch(tid)
+        return self.render()
+
+    async def fetch(self, tid):
+        frames = self.frames.get(tid, [])
+        start = len(frames)
+        commands = ['-stack-list-frames --thread {} {} {}'.format(
+            tid, start, start + self.page_size - 1)]
+        if tid not in self.depths:
+            commands.append('-stack-info-depth --thread {} {}'.format(tid, self.depth_limit))
+        results = await self.ctrl.get_command_results(commands)
+        if results[0] is None or results[0]['message'] != 'done':
+            self.frames[tid] = frames
+            self.depths[tid] = len(frames)
+            return
+        stack = results[0]['payload'].get('stack', [])
+        self.frames[tid] = frames + [Frame(frame) for frame in stack]
+        if len(results) > 1:
+            if results[1] is not None and results[1]['message'] == 'done':
+                self.depths[tid] = int(results[1]['payload']['depth'])
+            else:
+                self.depths[tid] = len(self.frames[tid])
+
+    def render(self):
+        tid = self.thread_id
+        header = '* thread #{}'.format(tid)
+        thread = self.ctrl.buffers.threads.records.get(tid)
+        if thread is not None and thread.target_id is not None:
+            header += ': {}'.format(thread.target_id)
+        if tid == self.ctrl.state.thread_id and self.ctrl.state.reason:
+            header += ', stop reason = {}'.format(self.ctrl.state.reason)
+        lines = [header]
+        frames = self.frames.get(tid, [])
+        for frame in frames:
+            lines.append(frame_line(frame, frame.level == self.level))
+        depth = self.depths.get(tid, 0)
+        if depth > len(frames):
+            lines.append('    ... {}{} more frames'.format(
+                depth - len(frames), '+' if depth >= self.depth_limit else ''))
+        return lines
@@ -0,0 +1,142 @@
+# Breakpoints, maintained incrementally from the =breakpoint-created/modified/deleted
+# notifications of GDB/MI (and the results of breakpoint commands).
+
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+
+from .renderer import breakpoint_lines
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class Breakpoint:
+    __slots__ = ('number', 'bkpt', 'locations')
+
+    def __init__(self, bkpt):
+        self.number = bkpt['number']
+        self.bkpt = bkpt
+        # [(number, file, line, bkpt)] of the code locations; multi-location
+        # breakpoints (e.g. in templates or inlined functions) have one per instance
+        self.locations = []
+        if 'locations' in bkpt:
+            for loc in bkpt['locations']:
+                self.add_location(loc)
+        elif bkpt.get('addr') != '<MULTIPLE>':
+            self.add_location(bkpt)
+
+    def add_location(self, loc):
+        self.locations.append((loc.get('number', self.number),
+                               loc.get('fullname') or loc.get('file'),
+                               int(loc['line']) if 'line' in loc else None, loc))
+
+    def is_complete(self):
+        """ False for a multi-location breakpoint as reported by gdb < 13, where
+            pygdbmi drops the locations following the breakpoint.
+        """
+        return self.bkpt.get('addr') != '<MULTIPLE>' or 'locations' in self.bkpt
+
+    def keys(self):
+        """ The (file, line) pairs of the locations. """
+        return set((f, l) for _, f, l, _ in self.locations if f and l is not None)
+
+
+class BreakpointIndex:
+    """ Breakpoints indexed by number, and by (file, line) of their locations. The
+        locations whose set of breakpoints changed since the last call to
+        take_changes are kept, so that signs are updated only for them.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.by_number = {}  # maps number -> <Breakpoint object>
+        self.by_key = {}  # maps (file, line) -> set of breakpoint numbers
+        self.changed = set()  # (file, line) keys that gained or lost a breakpoint
+        self.incomplete = set()  # numbers of breakpoints to be fetched again
+        self.version = 0  # bumped on every change
+
+    def clear(self):
+        """ Forget all breakpoints (their keys are reported as changed). """
+        self.changed.update(self.by_key)
+        self.by_number = {}
+        self.by_key = {}
+        self.incomplete = set()
+        self.version += 1
+
+    def update(self, record):
+        """ Apply a =breakpoint-* notification. Returns False if `record` is not one. """
+        if record.get('type') != 'notify':
+            return False
+        message = record.get('message')
+        if message in ('breakpoint-created', 'breakpoint-modified'):
+            self.add(record['payload']['bkpt'])
+        elif message == 'breakpoint-deleted':
+            self.remove(record['payload']['id'])
+        else:
+            return False
+        return True
+
+    def add(self, bkpt):
+        """ Add or replace a breakpoint, given its bkpt tuple. """
+        bp = Breakpoint(bkpt)
+        old = self.by_number.get(bp.number)
+        old_keys = old.keys() if old is not None else set()
+        new_keys = bp.keys()
+        for key in old_keys - new_keys:
+            self.unlink(key, bp.number)
+        for key in new_keys - old_keys:
+            self.by_key.setdefault(key, set()).add(bp.number)
+            self.changed.add(key)
+        self.by_number[bp.number] = bp
+        self.incomplete.discard(bp.number)
+        if not bp.is_complete():
+            self.incomplete.add(bp.number)
+        self.version += 1
+
+    def add_table(self, table):
+        """ Add the breakpoints of a BreakpointTable (see -break-list or -break-info),
+            where the locations of a breakpoint follow it.
+        """
+        rows = table.get('body', [])
+        for i, row in enumerate(rows):
+            if '.' in row['number']:
+                continue
+            locations = []
+            for loc in rows[i + 1:]:
+                if '.' not in loc['number']:
+                    break
+                locations.append(loc)
+            if locations or row.get('addr') == '<MULTIPLE>':
+                row = dict(row, locations=locations)
+            self.add(row)
+
+    def remove(self, number):
+        bp = self.by_number.pop(number, None)
+        if bp is None:
+            return
+        self.incomplete.discard(number)
+        for key in bp.keys():
+            self.unlink(key, number)
+        self.version += 1
+
+    def unlink(self, key, number):
+        numbers = self.by_key[key]
+        numbers.discard(number)
+        if not numbers:
+            del self.by_key[key]
+        self.changed.add(key)
+
+    def take_changes(self):
+        """ Returns (and forgets) the keys that changed, as {(file, line): present}. """
+        changed, self.changed = self.changed, set()
+        return dict((key, key in self.by_key) for key in changed)
+
+    def at(self, filepath, line):
+        """ Numbers of the breakpoints at a location. """
+        return self.by_key.get((filepath, line), set())
+
+    def lines(self):
+        lines = []
+        for number in sorted(self.by_number, key=int):
+            lines += breakpoint_lines(self.by_number[number])
+        return lines
@@ -2,17 +2,36 @@ from __future__ import (absolute_import, division, print_function)
 
 from signal import SIGINT
 from os import path
-
+from time import time
+import asyncio
+import json
+
+from .breakpoints import BreakpointIndex
+from .dispatcher import Dispatcher, mi_quote
+from .program_state import ProgramState
+from .renderer import record_text
+from .scheduler import RefreshScheduler
 from .vim_buffers import VimBuffers
 from .session import Session
-
-from pygdbmi.gdbcontroller import GdbController
+from .warm import Standby, Target, loaded_file
 
 __metaclass__ = type  # pylint: disable=invalid-name
 
 
+def gdb_controller():
+    """ Start gdb. pygdbmi is imported on first use, as importing it takes most of
+        the startup time of the server.
+    """
+    from pygdbmi.gdbcontroller import GdbController
+    return GdbController()
+
+
 class Controller():  # pylint: disable=too-many-instance-attributes
     """ Thread object that handles GDB events and commands. """
+    flood_lines = 2048  # lines of inferior output per second before it is interrupted
+    flood_chars = 1 << 20  # likewise, for characters
+    standby_timeout = 5  # seconds to wait for a parked gdb before starting another one
+    standby_load_timeout = 300  # likewise, while it loads symbols
 
     def __init__(self, vimx):
         """ Creates the GDB SBDebugger object and more! """
@@ -20,144 +39,300 @@ class Controller():  # pylint: disable=too-many-instance-attributes
         self.logger = logging.getLogger(__name__)
 
         self.dbg = None
+        self.standby = None  # <Standby object> kept running between debug modes
+        self.target = None  # <Target object> whose symbols gdb has loaded
+        self.gdb_settings = []  # MI commands run whenever gdb is started
 
-        self._proc_cur_line_len = 0
+        # inferior output in the current 1 second window
+        self._proc_since = 0
         self._proc_lines_count = 0
+        self._proc_chars_count = 0
+        self._proc_dropped = 0
 
-        self.result_queue = []
+        self.mi = Dispatcher(self)
+        self.state = ProgramState()
+        self.breakpoints = BreakpointIndex()
+        self.bp_toggling = set()  # (file, line) keys waiting for gdb to switch a breakpoint
 
         self.vimx = vimx
-        self.busy_stack = 0  # when > 0, buffers are not updated
+        self.stats = vimx.stats
+        self.lock = None  # asyncio.Lock serializing requests and refreshes, once running
+        self.refresher = RefreshScheduler(self)
         self.buffers = VimBuffers(self, vimx)
         self.session = Session(self, vimx)
 
     def dbg_start(self):
         if self.dbg is None:
-            self.dbg = GdbController()
+            standby, self.standby = self.standby, None
+            if standby is not None and standby.alive():
+                self.target = standby.target
+                self.dbg = standby.release()
+            else:
+                if standby is not None:
+                    standby.stop()
+                self.target = None
+                self.dbg = gdb_controller()
+                self.mi.submit(self.gdb_settings)
+            for fileno in self.dbg.read_list:
+                self.vimx.loop.add_reader(fileno, self.poke)
+            self.buffers.disassembly.clear()
+            self.buffers.registers.clear()
+            self.buffers.variables.clear()
+            self.state.clear()
+            # report the locations of multi-location breakpoints as a list (gdb >= 10)
+            self.mi.submit(['-fix-multi-location-breakpoint-output'])
 
     def dbg_interrupt(self):
         self.dbg.gdb_process.send_signal(SIGINT) # what if remote process?
 
     def dbg_stop(self):
-        self.dbg.exit()
-        self.dbg = None
+        self.dbg_detach().exit()
         self.logger.info('Terminated!')
 
-    def is_busy(self):
-        return self.busy_stack > 0
-
-    def busy_more(self):
-        self.busy_stack += 1
-
-    def busy_less(self):
-        self.busy_stack -= 1
-        if self.busy_stack < 0:
-            self.logger.critical("busy_stack < 0")
-            self.busy_stack = 0
-
-    def get_program_counters(self):
-        return []
+    def dbg_park(self):
+        """ Stop debugging, but keep gdb running as the standby, with the inferior
+            killed, and no breakpoints or varobjs left; the symbols stay loaded.
+        """
+        commands = self.buffers.variables.release() + ['kill', '-break-delete']
+        if self.state.running:
+            self.dbg_interrupt()  # gdb reads no command until the program stops
+        self.standby = Standby(self.dbg_detach(), self.vimx.loop)
+        self.standby.target = self.target
+        self.standby.write(commands)
+        self.logger.info('Parked gdb, with %s loaded', self.target and self.target.path)
+
+    def dbg_detach(self):
+        """ Forget about gdb, and return its GdbController. """
+        dbg, self.dbg = self.dbg, None
+        for fileno in dbg.read_list:
+            self.vimx.loop.remove_reader(fileno)
+        self.refresher.cancel()
+        self.mi.cancel_all()
+        self.state.clear()
+        self.breakpoints.clear()
+        self.buffers.breakpoints_changed()
+        self.buffers.pcs.clear()
+        self.buffers.backtrace.clear()
+        return dbg
+
+    def standby_start(self, filename):
+        """ Start a gdb in the background, and load the symbols of `filename` into
+            it, unless the standby gdb has them already.
+        """
+        if self.standby is not None:
+            if self.standby.alive() and self.standby.target is not None \
+                    and self.standby.target.unchanged(filename):
+                return
+            self.standby_stop()
+        if self.dbg is None:
+            self.standby = Standby(gdb_controller(), self.vimx.loop)
+            self.standby.load(Target(filename), self.gdb_settings)
+            self.logger.info('Loading %s into the standby gdb', filename)
+
+    def standby_stop(self):
+        if self.standby is not None:
+            self.standby.stop()
+            self.standby = None
+
+    async def standby_ready(self):
+        """ Wait until the standby gdb, if any, has answered all its commands, e.g.
+            finished loading symbols. A standby gdb still busy after a timeout is
+            stopped, so that the next debug mode starts a new one.
+        """
+        if self.standby is None or self.standby.loaded.done():
+            return
+        timeout = self.standby_timeout
+        if self.standby.loading():
+            timeout = self.standby_load_timeout
+            self.vimx.log('Waiting for gdb to load {}...'.format(self.standby.target.path), 0)
+        try:
+            await asyncio.wait_for(asyncio.shield(self.standby.loaded), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning('Standby gdb did not answer in %s seconds', timeout)
+            self.standby_stop()
 
-    def get_breakpoints(self):
-        return []
+    def target_loaded(self, command):
+        """ Whether `command` loads the target gdb has loaded already, unchanged. """
+        filename = loaded_file(command)
+        return bool(filename) and self.target is not None and self.target.unchanged(filename)
 
     def serialize_mijson(self, result):
-        out = "message: {}, stream: {}, token: {}, type: {}\n".format(result.get('message'),
-                                                                      result.get('stream'),
-                                                                      result.get('token'),
-                                                                      result.get('type'))
-        payload = result.get('payload')
-        if isinstance(payload, str):
-            payload = payload.encode('utf8').decode('unicode_escape')
-        else:
-            payload = str(payload)
-        out += "{}\n".format(payload)
-        self.buffers.logs_append(out, u'\u2713')
+        """ Show a record in the logs buffer. """
+        self.buffers.logs_append(*record_text(result))
 
-    def execute(self, command):
-        """ Run command in the interpreter, refresh all buffers, and display the
-            result in the logs buffer. Returns True if succeeded.
+    async def execute(self, command):
+        """ Run command in the interpreter, display the result in the logs buffer,
+            and request a refresh of all buffers, unless the inferior was resumed
+            (buffers are then refreshed once it stops again).
         """
         self.buffers.logs_append(u'\u2192(gdb) {}\n'.format(command))
-        result = self.get_command_result(command)
+        result = await self.get_command_result(command)
+        filename = loaded_file(command)
+        if filename is not None:
+            ok = filename and result is not None and result['message'] == 'done'
+            self.target = Target(filename) if ok else None
         if result is not None:
             self.serialize_mijson(result)
         else:
-            self.logs_append("error\n", u'\u2717')
+            self.buffers.logs_append("error\n", u'\u2717')
 
-        self.update_buffers()
+        if not self.state.running and (result is None or result['message'] != 'running'):
+            self.refresher.request()
 
     def complete_command(self, arg, line, pos):
         """ Returns a list of viable completions for line, and cursor at pos. """
         # TODO complete the first word?
         return []
 
-    def update_buffers(self, buf=None):
-        """ Update gdb buffers and signs placed in source files.
-            @param buf
-                If None, all buffers and signs would be updated.
-                Otherwise, update only the specified buffer.
+    async def do_breakswitch(self, bufnr, line):
+        """ Switch breakpoint at the specified line in the buffer. A pending sign is
+            shown right away, and confirmed or rolled back once gdb answers.
         """
-        if self.is_busy():
+        filepath = await self.vimx.buffer_path(bufnr)
+        if not filepath or self.dbg is None:
             return
-        if buf is None:
-            self.buffers.update()
-        else:
-            self.buffers.update_buffer(buf)
-
-    def bp_set_line(self, spath, line):
-        filepath = path.abspath(spath)
-        self.buffers.logs_append(u'\u2192(gdb-bp) {}:{}\n'.format(spath, line))
-        #self.execute("b {}:{}".format(filepath, line)) #TODO
-        #self.update_buffers(buf='breakpoints')
-
-    def do_breakswitch(self, bufnr, line):
-        """ Switch breakpoint at the specified line in the buffer. """
-        key = (bufnr, line)
-        if key in self.buffers.bp_list:
-            bp = self.buffers.bp_list[key]
-            #self.execute("delete breakpoints {}".format(bp.id)) #TODO
+        key = (filepath, line)
+        for fpath in (filepath, path.realpath(filepath)):  # as gdb might resolve links
+            if self.breakpoints.at(fpath, line):
+                key = (fpath, line)
+                break
+        if key in self.bp_toggling:
+            return  # gdb has not answered the previous switch yet
+        self.buffers.bp_pending(key, bufnr)
+        self.bp_toggling.add(key)
+        asyncio.ensure_future(self.bp_toggle(key, sorted(self.breakpoints.at(*key), key=int)))
+
+    async def bp_toggle(self, key, numbers):
+        """ Delete the breakpoints `numbers` at `key`, or insert one there if none. """
+        try:
+            if numbers:
+                command = '-break-delete {}'.format(' '.join(numbers))
+            else:
+                self.buffers.logs_append(u'\u2192(gdb-bp) {}:{}\n'.format(*key))
+                command = '-break-insert -f {}'.format(mi_quote('{}:{}'.format(*key)))
+            result = await self.get_command_result(command)
+            if result is None or result['message'] != 'done':
+                self.buffers.logs_append('{}\n'.format(
+                    ((result or {}).get('payload') or {}).get('msg', 'error')), u'\u2717')
+                return
+            # gdb does not notify about the effects of MI commands
+            if numbers:
+                for number in numbers:
+                    self.breakpoints.remove(number)
+            else:
+                self.breakpoints.add(result['payload']['bkpt'])
+            self.buffers.breakpoints_changed()
+        finally:
+            self.bp_toggling.discard(key)
+            self.buffers.bp_settle(key)
+
+    async def bp_insert(self, locations):
+        """ Insert breakpoints at all (file, line, options) `locations`, with a single
+            write to gdb; `options` may give the "cond", "ignore" count and "enabled"
+            state of the breakpoint. Breakpoints in code that is not loaded yet (e.g.
+            in shared libraries) are left pending.
+        """
+        commands = []
+        for filepath, line, options in locations:
+            command = '-break-insert -f'
+            if options.get('cond'):
+                command += ' -c {}'.format(mi_quote(options['cond']))
+            if options.get('ignore'):
+                command += ' -i {}'.format(int(options['ignore']))
+            if not options.get('enabled', True):
+                command += ' -d'
+            commands.append('{} {}'.format(command, mi_quote('{}:{}'.format(filepath, line))))
+        results = await self.get_command_results(commands)
+        for loc, result in zip(locations, results):
+            if result is not None and result['message'] == 'done':
+                self.breakpoints.add(result['payload']['bkpt'])
+            else:
+                self.buffers.logs_append('Cannot set a breakpoint at {}:{}\n'.format(*loc[:2]),
+                                         u'\u2717')
+        self.buffers.breakpoints_changed()
+
+    async def do_breakdelete(self, bp_id):
+        """ Delete a breakpoint by id (all of its locations, given a location id). """
+        number = str(bp_id).split('.')[0]
+        if not number:
+            return
+        result = await self.get_command_result('-break-delete {}'.format(number))
+        if result is not None and result['message'] == 'done':
+            # gdb does not notify about the effects of MI commands
+            self.breakpoints.remove(number)
+            self.buffers.breakpoints_changed()
+
+    async def do_select_thread_and_frame(self, thread, frame):
+        """ Select a thread and/or a frame of it (either may be ''). The backtrace
+            pane is redrawn from the frames cached since the last stop, and the other
+            panes are refreshed as usual.
+        """
+        commands = []
+        if thread != '':
+            commands.append('-thread-select {}'.format(thread))
+        if frame != '':
+            commands.append('-stack-select-frame {}'.format(frame))
+        if not commands or self.dbg is None or self.state.running:
+            return
+        for result in await self.get_command_results(commands):
+            if result is None or result['message'] != 'done':
+                msg = ((result or {}).get('payload') or {}).get('msg', 'error')
+                self.vimx.log('Cannot select thread/frame: {}'.format(msg))
+                return
+        if thread != '':
+            self.buffers.threads.current = str(thread)
+        self.buffers.pcs.level = int(frame) if frame != '' else 0
+        await self.buffers.update_buffers(['backtrace', 'threads'])
+        self.refresher.request()
+
+    def do_stats(self, arg):
+        """ Show the timing statistics in buffer `arg` (a number), write them to the
+            file `arg` as JSON, or forget them if `arg` is 'reset'.
+        """
+        if isinstance(arg, int):
+            self.vimx.update_noma_buffer(arg, self.stats.lines())
+        elif arg == 'reset':
+            self.stats.clear()
         else:
-            self.bp_set_line(self.vimx.get_buffer_name(bufnr), line)
-
-    def do_breakdelete(self, bp_id):
-        """ Delete a breakpoint by id """
-        #self.execute("breakpoint delete {}".format(bp_id)) #TODO
-        pass
+            try:
+                with open(path.expanduser(arg), 'w') as out:
+                    json.dump(self.stats.summary(), out, indent=4, sort_keys=True)
+            except (IOError, OSError) as e:
+                self.vimx.log('Cannot write {}: {}'.format(arg, e), 2)
+                return
+            self.vimx.log('Statistics written to {}'.format(arg), 0)
 
     def put_stdin(self, instr):
         #if process is running:
         self.dbg.write(instr, 0, read_response=False)
 
-    def get_command_result(self, command):
-        """ Runs command in the interpreter and returns (success, output)
+    async def get_command_result(self, command):
+        """ Runs command in the interpreter and returns its result record, or None
+            if gdb did not answer in time.
             Not to be called directly for commands which changes debugger state;
             use execute instead.
         """
         #FIXME run only if process is not running?
+        return (await self.get_command_results([command]))[0]
 
-        if len(self.result_queue) > 0: # garbage?
-            self.logger.warning('result cleaned: %s', self.result_queue.pop())
-            self.result_queue = []     # clean
-        self.logger.info('(gdb) %s', command)
-        self.dbg.write(command, 0, read_response=False)
-
-        count = 0
-        while len(self.result_queue) == 0:
-            self.poke()
-            count += 1
-            if count > 8:
-                self.logger.warning('(gdb-no-result) %s', command)
-                return None
-        result = self.result_queue.pop()
-        return result
+    async def get_command_results(self, commands):
+        """ Like get_command_result, but writes all the commands at once, and waits
+            for all of their results.
+        """
+        if self.dbg is None:
+            return [None] * len(commands)
+        return await self.mi.wait(self.mi.submit(commands))
 
     def poke(self):
-        """ Pokes the gdb process for responses. """
+        """ Reads the responses gdb has written so far (without blocking), and hands
+            result records over to the commands waiting for them.
+            Called by the event loop when gdb's output is readable.
+        """
         if self.dbg is None:
-            raise ValueError('Poked a non-existent dbg!')
+            self.logger.warning('Poked a non-existent dbg!')
+            return
         try:
-            responses = self.dbg.get_gdb_response(timeout_sec=0.5)
+            responses = self.dbg.get_gdb_response(timeout_sec=0, raise_error_on_timeout=False)
         except ValueError as e:
             self.logger.warning('Gdb poke error: %s', e)
             return
@@ -165,24 +340,52 @@ class Controller():  # pylint: disable=too-many-instance-attributes
             self.logger.critical('Unexpected error: %s', e)
             self.dbg_stop()
             return
+        if not responses and self.dbg.gdb_process.poll() is not None:
+            self.logger.critical('gdb exited with %s', self.dbg.gdb_process.returncode)
+            self.dbg_stop()
+            return
 
+        bp_changed = False
         for resp in responses:
-            if resp['type'] == 'result':
-                self.result_queue.append(resp)
-            else:
+            if resp['type'] == 'output':
+                self.inferior_output(resp['payload'])
+            elif not self.mi.dispatch(resp):
                 self.serialize_mijson(resp)
-
-            # TODO handle 'notify' events
-            # TODO handle 'output' and 'target' events
-            # TODO handle 'console', 'log' and 'done' events
-
-        #n_lines = self.buffers.logs_append(out)
-        #if n_lines == 0:
-        #    self._proc_cur_line_len += len(out)
-        #else:
-        #    self._proc_cur_line_len = 0
-        #    self._proc_lines_count += n_lines
-        #if self._proc_cur_line_len > 8192 or self._proc_lines_count > 2048:
-        #    # detect and stop/kill insane process
-        #    self.dbg.gdb_process.send_signal(SIGINT) # remote process?
-        #    break
+                if self.breakpoints.update(resp):
+                    bp_changed = True
+                else:
+                    # TODO handle the other 'notify' events (only logged so far)
+                    state = self.state.update(resp)
+                    if state == 'running':
+                        self.buffers.threads.resumed(
+                            (resp.get('payload') or {}).get('thread-id', 'all'))
+                    elif state in ('stopped', 'exited'):
+                        self.on_stop()
+        if bp_changed:
+            self.buffers.breakpoints_changed()
+
+    def on_stop(self):
+        """ Refresh the buffers after the inferior stopped. """
+        self.refresher.request()
+
+    def inferior_output(self, line):
+        """ Log a line of inferior output. An inferior flooding the logs gets
+            interrupted, and the rest of its output in the current second is dropped.
+        """
+        now = time()
+        if now - self._proc_since >= 1:
+            if self._proc_dropped > 0:
+                self.buffers.logs_append(
+                    '{} lines of output dropped\n'.format(self._proc_dropped), u'\u2717')
+            self._proc_since = now
+            self._proc_lines_count = self._proc_chars_count = self._proc_dropped = 0
+        self._proc_lines_count += 1
+        self._proc_chars_count += len(line)
+        if self._proc_lines_count > self.flood_lines \
+                or self._proc_chars_count > self.flood_chars:
+            if self._proc_dropped == 0:
+                self.buffers.logs_append('Output flood! Interrupting the process\n', u'\u2717')
+                self.dbg_interrupt()
+            self._proc_dropped += 1
+        else:
+            self.buffers.logs_append(line + '\n')
@@ -0,0 +1,118 @@
+# One server process per user, which Vim instances connect to over a Unix socket
+# instead of starting a server of their own: every connection is served by a
+# fork of the daemon, which has the modules of the server imported already.
+
+from __future__ import (absolute_import, division, print_function)
+
+from os import path
+from time import time
+import errno
+import logging
+import os
+import select
+import socket
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+def private_dir(dirname):
+    """ Create `dirname` if need be. Raises OSError if others can access it, as
+        they could then pose as the daemon.
+    """
+    try:
+        os.makedirs(dirname, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.stat(dirname)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise OSError(errno.EPERM, 'Others can access {}'.format(dirname))
+
+
+class Daemon:
+    """ Accepts connections on the socket at `sockpath`, and calls `serve` with each
+        one in a child process. Exits once it had no connection for `idle_timeout`
+        seconds (0 = never).
+    """
+    poll_interval = 1.0  # seconds between two checks for exited children
+
+    def __init__(self, sockpath, serve, idle_timeout=3600):
+        self.logger = logging.getLogger(__name__)
+        self.sockpath = sockpath
+        self.serve = serve
+        self.idle_timeout = idle_timeout
+        self.children = set()  # pids of the processes serving a connection
+
+    def listen(self):
+        """ Bind the socket, unless another daemon listens on it already (None). """
+        private_dir(path.dirname(self.sockpath))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.sockpath)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.sockpath)
+                sock.close()
+                return None
+            except OSError:  # left by a daemon that crashed
+                os.unlink(self.sockpath)
+                sock.bind(self.sockpath)
+            finally:
+                probe.close()
+        sock.listen(16)
+        return sock
+
+    def reap(self):
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except OSError:  # no child left
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            self.children.discard(pid)
+
+    def run(self):
+        sock = self.listen()
+        if sock is None:
+            self.logger.info('A daemon listens on %s already', self.sockpath)
+            return
+        inode = os.stat(self.sockpath).st_ino
+        self.logger.info('Listening on %s', self.sockpath)
+        idle_since = time()
+        try:
+            while True:
+                ready, _, _ = select.select([sock], [], [], self.poll_interval)
+                self.reap()
+                if ready:
+                    conn, _ = sock.accept()
+                    self.fork(sock, conn)
+                if self.children or ready:
+                    idle_since = time()
+                elif self.idle_timeout and time() - idle_since > self.idle_timeout:
+                    self.logger.info('Idle for %s seconds, exiting', self.idle_timeout)
+                    break
+        finally:
+            sock.close()
+            try:
+                if os.stat(self.sockpath).st_ino == inode:  # not taken over since
+                    os.unlink(self.sockpath)
+            except OSError:
+                pass
+
+    def fork(self, sock, conn):
+        accepted = time()
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            try:
+                self.serve(conn, accepted)
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+        conn.close()
+        self.children.add(pid)
+        self.logger.info('Serving a connection in process %s', pid)
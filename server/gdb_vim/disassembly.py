@@ -0,0 +1,121 @@
+# Disassembly pane: a window of instructions around the PC, backed by a cache of
+# previously decoded address ranges.
+
+from __future__ import (absolute_import, division, print_function)
+
+from collections import OrderedDict
+import logging
+
+from .renderer import instruction_line
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class Disassembly:
+    window_before = 64  # bytes shown before the pc
+    window_after = 192  # bytes shown after the pc
+    window_step = 256  # bytes added to the window when scrolling past its edge
+    cache_size = 32  # number of decoded ranges kept
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.logger = logging.getLogger(__name__)
+        # maps (objfile, start, stop) -> [(address, func, offset, inst)], where the
+        # instructions starting in [start, stop) are all decoded
+        self.ranges = OrderedDict()
+        self.objfile = None
+        self.pc = None
+        self.start = None  # the window spans [start, end)
+        self.end = None
+
+    def clear(self):
+        """ Forget everything, e.g. when the target is reloaded. """
+        self.ranges.clear()
+        self.objfile = self.pc = self.start = self.end = None
+
+    async def lines(self, frame):
+        """ Returns the lines of the pane for the selected `frame` (as reported by
+            -stack-info-frame). The window is kept as long as the pc stays inside it.
+        """
+        try:
+            pc = int(frame['addr'], 16)
+        except (KeyError, TypeError, ValueError):
+            return []
+        objfile = frame.get('from', '')
+        if objfile != self.objfile or self.start is None \
+                or not self.start <= pc < self.end - self.window_after // 2:
+            self.objfile = objfile
+            self.start = pc - self.window_before
+            self.end = pc + self.window_after
+        self.pc = pc
+        return self.render(await self.instructions())
+
+    async def extend(self, direction):
+        """ Grow the window 'up' or 'down', and return the new lines of the pane. """
+        if self.pc is None:
+            return None
+        if direction == 'up':
+            self.start -= self.window_step
+        else:
+            self.end += self.window_step
+        return self.render(await self.instructions())
+
+    def render(self, insns):
+        return [instruction_line(addr, func, offset, inst, addr == self.pc)
+                for addr, func, offset, inst in insns]
+
+    async def instructions(self):
+        """ Decoded instructions in the window. Only the parts that are not covered
+            by a cached range containing the pc are disassembled.
+        """
+        key = None
+        for rkey in self.ranges:
+            if rkey[0] == self.objfile and rkey[1] <= self.pc < rkey[2]:
+                key = rkey
+                break
+
+        if key is None:
+            insns = await self.fetch(self.start, self.end, self.pc)
+            start, stop = (insns[0][0] if insns else self.start), self.end
+        else:
+            insns = self.ranges.pop(key)
+            start, stop = key[1], key[2]
+            if self.start < start:
+                head = await self.fetch(self.start, start + 1, start)
+                insns = [i for i in head if i[0] < start] + insns
+                start = insns[0][0]
+            if self.end > stop:
+                # the last instruction may reach past `stop`; decode on from it
+                tail = await self.fetch(insns[-1][0], self.end, insns[-1][0])
+                if tail:
+                    insns = insns[:-1] + tail
+                    stop = self.end
+
+        if insns:
+            self.ranges[(self.objfile, start, stop)] = insns
+            while len(self.ranges) > self.cache_size:
+                self.ranges.popitem(last=False)
+        return [i for i in insns if self.start <= i[0] < self.end]
+
+    async def fetch(self, start, end, anchor):
+        """ Disassemble [start, end), where `anchor` is known to start an instruction.
+            On variable-length ISAs decoding from `start` may run out of step with the
+            real instruction stream; if it doesn't land on `anchor`, the part before
+            `anchor` is dropped.
+        """
+        insns = await self.disassemble(start, end)
+        if start < anchor and not any(i[0] == anchor for i in insns):
+            self.logger.debug('Misaligned disassembly at %#x, retrying from %#x', start, anchor)
+            insns = await self.disassemble(anchor, end)
+        return insns
+
+    async def disassemble(self, start, end):
+        result = await self.ctrl.get_command_result(
+            '-data-disassemble -s {:#x} -e {:#x} -- 0'.format(max(start, 0), end))
+        if result is None or result['message'] != 'done':
+            return []
+        insns = []
+        for insn in result['payload'].get('asm_insns', []):
+            insns.append((int(insn['address'], 16), insn.get('func-name'),
+                          insn.get('offset'), insn.get('inst', '')))
+        return insns
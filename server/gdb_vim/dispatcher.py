@@ -0,0 +1,93 @@
+# Routes token-tagged GDB/MI result records to the commands that caused them.
+
+from __future__ import (absolute_import, division, print_function)
+
+from time import time
+import asyncio
+import logging
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+def mi_quote(arg):
+    """ Quote `arg` as an MI c-string, e.g. for expressions containing spaces. """
+    return '"{}"'.format(arg.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+class MIFuture(asyncio.Future):
+    """ Placeholder for the result record of a single MI command. """
+
+    def __init__(self, token, command):
+        super(MIFuture, self).__init__()
+        self.token = token
+        self.command = command
+        self.sent = time()
+
+
+class Dispatcher:
+    """ Tags every MI command with a unique token, and resolves the corresponding
+        MIFuture as soon as its result record is read from gdb.
+    """
+    timeout = 60  # seconds to wait for gdb before giving up on a command
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.logger = logging.getLogger(__name__)
+        self.token = 0
+        self.pending = {}  # maps token -> <MIFuture object>
+
+    def submit(self, commands):
+        """ Write all `commands` to gdb in one go, and return a list of futures. """
+        futures = []
+        lines = []
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        for command in commands:
+            self.token += 1
+            future = MIFuture(self.token, command)
+            self.pending[future.token] = future
+            futures.append(future)
+            lines.append('{}{}'.format(future.token, command))
+            if debug:
+                self.logger.debug('(gdb) %s', command)
+        if lines:
+            self.ctrl.dbg.write('\n'.join(lines), 0, read_response=False)
+        return futures
+
+    def dispatch(self, record):
+        """ Resolve the future waiting for `record`. Returns False if nobody claims it. """
+        if record.get('type') != 'result':
+            return False
+        future = self.pending.pop(record.get('token'), None)
+        if future is None:
+            return False
+        self.ctrl.stats.record('mi', future.command.split(' ', 1)[0],
+                               time() - future.sent)
+        if not future.done():  # unless its waiter was cancelled
+            future.set_result(record)
+        return True
+
+    async def wait(self, futures, timeout=None):
+        """ Wait until all `futures` are resolved, and return their results. Futures
+            still pending after `timeout` seconds are cancelled, and result in None.
+        """
+        if not futures:
+            return []
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            _, pending = await asyncio.wait(futures, timeout=timeout)
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()  # its result record is dropped once it arrives
+            raise
+        for future in pending:
+            self.logger.warning('(gdb-no-result) %s', future.command)
+            self.pending.pop(future.token, None)
+            future.cancel()
+        return [None if f.cancelled() else f.result() for f in futures]
+
+    def cancel_all(self):
+        """ Cancel all pending futures, e.g. when gdb goes away. """
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.cancel()
@@ -0,0 +1,107 @@
+# Program counter signs: one at the innermost frame of every thread, and a
+# 'selected' one at the selected frame.
+
+from __future__ import (absolute_import, division, print_function)
+
+from os import path
+import logging
+
+from .records import Frame
+from .vim_signs import PCSign
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class PCTracker:
+    """ Keeps the PC signs in sync with the frames of the threads whose details are
+        known (see ThreadList), i.e. of every thread up to `threads#signs_max`
+        threads: signs are only placed, changed or removed at the locations where
+        the set of stopped threads changed.
+    """
+
+    def __init__(self, ctrl, vimx, threads):
+        self.ctrl = ctrl
+        self.vimx = vimx
+        self.logger = logging.getLogger(__name__)
+        self.threads = threads
+        self.thread_frames = {}  # maps thread id -> its innermost frame
+        self.thread_locs = {}  # maps thread id -> (fullname, line, (file, line) or None)
+        self.signs = {}  # maps (file, line) -> <PCSign object>
+        self.selected = None  # (file, line) of the selected frame
+        self.level = 0  # level of the selected frame
+
+    def clear(self):
+        """ Remove all signs, e.g. when gdb is stopped. """
+        for sign in self.signs.values():
+            sign.hide()
+        self.signs = {}
+        self.threads.clear()
+        self.thread_frames = {}
+        self.thread_locs = {}
+        self.selected = None
+        self.level = 0
+
+    def thread_location(self, tid, frame):
+        """ (file, line) of a thread's frame, if its source is available. Cached as
+            long as the thread stays at the same line, which spares checking whether
+            the files of idle threads exist at every stop.
+        """
+        cached = self.thread_locs.get(tid)
+        if cached is not None and cached[:2] == (frame.fullname, frame.line):
+            return cached[2]
+        key = self.location(frame)
+        self.thread_locs[tid] = (frame.fullname, frame.line, key)
+        return key
+
+    @staticmethod
+    def location(frame):
+        if not frame.fullname or frame.line is None or not path.exists(frame.fullname):
+            return None
+        return (frame.fullname, frame.line)
+
+    async def update(self):
+        """ Move the signs to the current frames, and jump to the selected one if it
+            moved.
+        """
+        ids, frame = await self.ctrl.get_command_results(
+            ['-thread-list-ids', '-stack-info-frame'])
+        if ids is None or ids['message'] != 'done':
+            return
+        self.threads.set_ids(ids)
+        options = self.ctrl.buffers.options
+        await self.threads.fetch(max(options['threads#details_max'],
+                                     options['threads#signs_max']))
+
+        self.thread_frames = self.threads.frames()
+        wanted = {}  # maps (file, line) -> whether it is the selected frame
+        for tid, thread_frame in self.thread_frames.items():
+            key = self.thread_location(tid, thread_frame)
+            if key is not None:
+                wanted[key] = False
+        for tid in list(self.thread_locs):
+            if tid not in self.thread_frames:
+                del self.thread_locs[tid]
+
+        selected = None
+        self.level = 0
+        if frame is not None and frame['message'] == 'done':
+            frame = Frame(frame['payload']['frame'])
+            self.level = frame.level
+            selected = self.location(frame)
+            if selected is not None:
+                wanted[selected] = True
+
+        for key in set(self.signs) - set(wanted):
+            self.signs.pop(key).hide()
+        for key, is_selected in wanted.items():
+            sign = self.signs.get(key)
+            if sign is None:
+                bufnr = await self.vimx.buffer_add(key[0])
+                self.signs[key] = PCSign(self.vimx, bufnr, key[1], is_selected)
+            elif sign.selected != is_selected:
+                sign.set_selected(is_selected)
+
+        if selected is not None and selected != self.selected:
+            sign = self.signs[selected]
+            self.vimx.sign_jump(sign.bufnr, sign.id)
+        self.selected = selected
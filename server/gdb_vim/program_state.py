@@ -0,0 +1,50 @@
+# State of the inferior, as told by the exec-async records of GDB/MI
+# (*running and *stopped).
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class ProgramState:
+    exit_reasons = ('exited', 'exited-normally', 'exited-signalled')
+
+    def __init__(self):
+        self.running = False
+        self.alive = False  # whether there is a process
+        self.thread_id = None  # thread that caused the last stop
+        self.frame = None  # frame of the last stop
+        self.reason = None  # reason of the last stop
+        self.exit_code = None
+        self.stops = 0  # number of stops so far, e.g. to tell stale caches
+
+    def clear(self):
+        """ Forget everything, e.g. when gdb is restarted. """
+        self.__init__()
+
+    def update(self, record):
+        """ Update the state given an exec-async `record`. Returns the new state, i.e.
+            'running', 'stopped' or 'exited', or None if the record is not an
+            exec-async record.
+        """
+        if record.get('type') != 'notify':
+            return None
+        payload = record.get('payload') or {}
+        if record.get('message') == 'running':
+            self.running = True
+            self.alive = True
+            return 'running'
+        if record.get('message') != 'stopped':
+            return None
+        self.running = False
+        self.stops += 1
+        self.reason = payload.get('reason')
+        if self.reason in self.exit_reasons:
+            self.alive = False
+            self.thread_id = self.frame = None
+            self.exit_code = payload.get('exit-code')
+            return 'exited'
+        self.alive = True
+        self.thread_id = payload.get('thread-id')
+        self.frame = payload.get('frame')
+        return 'stopped'
@@ -0,0 +1,35 @@
+# Compact representations of the GDB/MI tuples that are kept around in large
+# numbers (frames of deep stacks, threads of big processes), instead of the
+# dicts built by pygdbmi.
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class Frame:
+    """ A frame tuple, as in the results of -stack-list-frames, -stack-info-frame
+        or -thread-info.
+    """
+    __slots__ = ('level', 'addr', 'func', 'file', 'fullname', 'line', 'objfile')
+
+    def __init__(self, frame):
+        self.level = int(frame.get('level', 0))
+        self.addr = frame.get('addr')
+        self.func = frame.get('func')
+        self.file = frame.get('file')
+        self.fullname = frame.get('fullname')
+        self.line = int(frame['line']) if 'line' in frame else None
+        self.objfile = frame.get('from')  # shared library, if no source is known
+
+
+class Thread:
+    """ A thread tuple, as in the result of -thread-info. """
+    __slots__ = ('id', 'target_id', 'name', 'state', 'frame')
+
+    def __init__(self, thread):
+        self.id = thread['id']
+        self.target_id = thread.get('target-id')
+        self.name = thread.get('name')
+        self.state = thread.get('state')
+        self.frame = Frame(thread['frame']) if 'frame' in thread else None
@@ -0,0 +1,62 @@
+# Registers pane: values are cached, and only the registers reported by
+# -data-list-changed-registers are fetched again after a stop.
+
+from __future__ import (absolute_import, division, print_function)
+
+from .renderer import register_line
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class Registers:
+    value_format = 'x'  # see -data-list-register-values
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.names = None  # register names, indexed by register number
+        self.values = {}  # maps register number -> value
+        self.changed = set()  # registers that changed at the last update
+
+    def clear(self):
+        """ Forget everything, e.g. when a new target is loaded. """
+        self.names = None
+        self.values = {}
+        self.changed = set()
+
+    async def lines(self, result):
+        """ Returns the lines of the pane, given the result of -data-list-changed-registers. """
+        if result is None or result['message'] != 'done':
+            return []
+        if self.names is None:
+            names = await self.ctrl.get_command_result('-data-list-register-names')
+            if names is None or names['message'] != 'done':
+                return []
+            self.names = names['payload']['register-names']
+
+        if self.values:
+            self.changed = set(int(n) for n in result['payload']['changed-registers'])
+            if self.changed:
+                await self.fetch(' '.join(str(n) for n in sorted(self.changed)))
+        else:
+            self.changed = set()
+            await self.fetch('')
+        return self.render()
+
+    async def fetch(self, numbers):
+        result = await self.ctrl.get_command_result(
+            '-data-list-register-values {} {}'.format(self.value_format, numbers).rstrip())
+        if result is None or result['message'] != 'done':
+            return
+        for reg in result['payload']['register-values']:
+            self.values[int(reg['number'])] = reg['value']
+
+    def render(self):
+        """ One line per register; the ones that changed at the last stop start with '*'. """
+        width = max([len(name) for name in self.names] + [0])
+        lines = []
+        for number, name in enumerate(self.names):
+            if not name or number not in self.values:
+                continue
+            lines.append(register_line(name, width, self.values[number],
+                                       number in self.changed))
+        return lines
@@ -0,0 +1,191 @@
+# Formats GDB/MI records and the state of the panes into lines of text, straight
+# from the parsed records.
+
+from __future__ import (absolute_import, division, print_function)
+
+import re
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+OK_MARKER = u'\u2713'
+ERROR_MARKER = u'\u2717'
+
+_ESCAPE_RE = re.compile(r'\\(?:([0-7]{1,3})|(.))', re.DOTALL)
+_OCTAL_RE = re.compile(r'\\[0-7]')
+_ESCAPE_BYTES_RE = re.compile(br'\\(?:([0-7]{1,3})|(.))', re.DOTALL)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f',
+            'v': '\v', 'e': '\x1b'}
+_ESCAPES_BYTES = dict((k.encode(), v.encode()) for k, v in _ESCAPES.items())
+
+
+def mi_unescape(text):
+    """ Decode the C escapes of a stream record (pygdbmi leaves them as is). Octal
+        escapes are bytes of the host charset, assumed to be UTF-8.
+    """
+    if '\\' not in text:
+        return text
+    if _OCTAL_RE.search(text) is None:
+        return _ESCAPE_RE.sub(lambda m: _ESCAPES.get(m.group(2), m.group(2)), text)
+
+    def unescape(match):
+        if match.group(1) is not None:
+            return bytes(bytearray([int(match.group(1), 8) & 0xff]))
+        return _ESCAPES_BYTES.get(match.group(2), match.group(2))
+    return _ESCAPE_BYTES_RE.sub(unescape, text.encode('utf8')).decode('utf8', 'replace')
+
+
+def mi_format(value, out):
+    """ Append the pieces of `value` (a parsed MI value) in MI syntax to `out`. """
+    if isinstance(value, dict):
+        out.append('{')
+        mi_format_results(value, out)
+        out.append('}')
+    elif isinstance(value, list):
+        out.append('[')
+        for i, item in enumerate(value):
+            if i:
+                out.append(',')
+            mi_format(item, out)
+        out.append(']')
+    else:
+        out.append('"{}"'.format(str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                 .replace('\n', '\\n')))
+
+
+def mi_format_results(payload, out):
+    first = True
+    for key, value in payload.items():
+        if not first:
+            out.append(',')
+        first = False
+        out.append(key)
+        out.append('=')
+        mi_format(value, out)
+
+
+def record_text(record):
+    """ Returns the text of a record as shown in the logs buffer, along with the
+        marker of its lines: the stream records of gdb are shown as text, and
+        the others in MI syntax.
+    """
+    kind = record.get('type')
+    payload = record.get('payload')
+    if kind in ('console', 'log', 'target'):
+        text = mi_unescape(payload or '')
+        return (text if text.endswith('\n') else text + '\n'), OK_MARKER
+    message = record.get('message')
+    if kind == 'result' and message == 'error':
+        return (payload or {}).get('msg', 'error') + '\n', ERROR_MARKER
+    out = []
+    if kind == 'result':
+        out.append('^')
+    elif kind == 'notify':
+        out.append('*' if message in ('running', 'stopped') else '=')
+    out.append(str(message))
+    if isinstance(payload, dict) and payload:
+        out.append(',')
+        mi_format_results(payload, out)
+    elif payload:
+        out.append(',{}'.format(payload))
+    out.append('\n')
+    return ''.join(out), OK_MARKER
+
+
+def frame_where(frame):
+    """ Function and source location of a Frame record. """
+    where = frame.func or '??'
+    if frame.file is not None:
+        where += ' at {}:{}'.format(frame.file, frame.line)
+    elif frame.objfile is not None:
+        where += ' from {}'.format(frame.objfile)
+    return where
+
+
+def frame_line(frame, selected):
+    """ A line of the backtrace pane. """
+    return '  {} frame #{}: {} {}'.format('*' if selected else ' ', frame.level,
+                                          frame.addr, frame_where(frame))
+
+
+def thread_line(tid, thread, selected):
+    """ A line of the threads pane; `thread` is None if its details are unknown. """
+    line = '{} thread #{}'.format('*' if selected else ' ', tid)
+    if thread is None:
+        return line
+    params = []
+    if thread.target_id is not None:
+        params.append('target = {}'.format(thread.target_id))
+    if thread.name is not None:
+        params.append('name = {}'.format(thread.name))
+    if thread.frame is not None:
+        params.append('frame = {}'.format(frame_where(thread.frame)))
+    elif thread.state == 'running':
+        params.append('state = running')
+    return '{}: {}'.format(line, ', '.join(params))
+
+
+def breakpoint_lines(bp):
+    """ Lines of the breakpoints pane for a Breakpoint: one for the breakpoint,
+        followed by one per location if it has several.
+    """
+    bkpt = bp.bkpt
+    params = []
+    if 'pending' in bkpt:
+        params.append('pending = {}'.format(bkpt['pending']))
+    elif len(bp.locations) > 1 or not bp.is_complete():
+        params.append('what = {}'.format(bkpt.get('original-location', '?')))
+        params.append('locations = {}'.format(len(bp.locations)))
+    else:
+        params += location_params(bp.locations[0][3])
+        if not params and 'what' in bkpt:  # e.g. watchpoints and catchpoints
+            params.append('{} = {}'.format(bkpt.get('type', 'what').split()[-1],
+                                           bkpt['what']))
+    if 'cond' in bkpt:
+        params.append('cond = {}'.format(bkpt['cond']))
+    params.append('hits = {}'.format(bkpt.get('times', 0)))
+    if bkpt.get('enabled') == 'n':
+        params.append('disabled')
+    lines = ['{}: {}'.format(bp.number, ', '.join(params))]
+    if len(bp.locations) > 1:
+        for number, _, _, loc in bp.locations:
+            params = location_params(loc)
+            if loc.get('enabled') == 'n':
+                params.append('disabled')
+            lines.append('  {}: {}'.format(number, ', '.join(params)))
+    return lines
+
+
+def location_params(loc):
+    params = []
+    if 'file' in loc:
+        params += ['file = {}'.format(loc['file']), 'line = {}'.format(loc.get('line'))]
+    if 'func' in loc:
+        params.append('func = {}'.format(loc['func']))
+    if 'file' not in loc and 'addr' in loc:
+        params.append('addr = {}'.format(loc['addr']))
+    return params
+
+
+def register_line(name, width, value, changed):
+    """ A line of the registers pane; the registers that changed at the last stop
+        start with '*'.
+    """
+    return '{} {:>{}} = {}'.format('*' if changed else ' ', name, width, value)
+
+
+def variable_line(node, depth):
+    """ A line of the locals pane for a VarNode, with its expansion marker. """
+    marker = ' '
+    if node.expandable():
+        marker = '-' if node.expanded else '+'
+    if node.type is None:  # e.g. "public" pseudo-children in C++
+        return '{}{} {}'.format('  ' * depth, marker, node.exp)
+    return '{}{} ({}) {} = {}'.format('  ' * depth, marker, node.type, node.exp, node.value)
+
+
+def instruction_line(addr, func, offset, inst, is_pc):
+    """ A line of the disassembly pane. """
+    marker = '=> ' if is_pc else '   '
+    if func:
+        return '{}{:#x} <{}+{}>:\t{}'.format(marker, addr, func, offset, inst)
+    return '{}{:#x}:\t{}'.format(marker, addr, inst)
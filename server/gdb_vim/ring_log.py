@@ -0,0 +1,68 @@
+# Logging into a bounded in-memory ring, written to disk only when an error is
+# logged, or on demand.
+
+from __future__ import (absolute_import, division, print_function)
+
+from collections import deque
+import logging
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+FORMAT = '%(asctime)s [%(levelname)s @ %(filename)s:%(funcName)s:%(lineno)s] - %(message)s'
+
+
+class RingHandler(logging.Handler):
+    """ Keeps the last `capacity` records, unformatted: messages are only
+        formatted when the ring is dumped, i.e. appended to `filename`. That
+        happens when a record of `dump_level` or above is handled, or when
+        `dump` is called.
+    """
+
+    def __init__(self, filename, capacity=10000, dump_level=logging.ERROR):
+        logging.Handler.__init__(self)
+        self.filename = filename
+        self.dump_level = dump_level
+        self.ring = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.ring.append(record)
+        if record.levelno >= self.dump_level:
+            try:
+                self.dump()
+            except (IOError, OSError):
+                self.handleError(record)
+
+    def dump(self, filename=None):
+        """ Append the records in the ring to `filename` (by default, the file given
+            at creation), and empty the ring. Returns the name of the file. Raises
+            IOError or OSError if the file cannot be opened; the ring is kept then.
+        """
+        filename = filename or self.filename
+        with open(filename, 'a') as out:
+            records, self.ring = self.ring, deque(maxlen=self.ring.maxlen)
+            for record in records:
+                try:
+                    out.write(self.format(record) + '\n')
+                except Exception:  # pylint: disable=broad-except
+                    self.handleError(record)
+        return filename
+
+
+def log_file():
+    """ Name of the file the root logger writes to, if any. """
+    for handler in logging.root.handlers:
+        if isinstance(handler, RingHandler):
+            return handler.filename
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+    return None
+
+
+def dump(filename=None):
+    """ Dump the ring of the RingHandler of the root logger, if any. Returns the
+        name of the file written, or None.
+    """
+    for handler in logging.root.handlers:
+        if isinstance(handler, RingHandler):
+            return handler.dump(filename)
+    return None
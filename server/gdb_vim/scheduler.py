@@ -0,0 +1,87 @@
+# Coalesces the refreshes of the gdb buffers requested by stops and commands.
+
+from __future__ import (absolute_import, division, print_function)
+
+from contextlib import contextmanager
+from time import time
+import asyncio
+import logging
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class RefreshScheduler:
+    """ Every request bumps a generation counter. A refresh starts once no other
+        request has arrived for the debounce window, and renders the state of its
+        generation; when a newer request arrives meanwhile, the refresh in flight
+        becomes stale, and gives up before sending anything to Vim. It is not
+        cancelled outright, as the answers to -var-update and
+        -data-list-changed-registers must not be lost.
+    """
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.logger = logging.getLogger(__name__)
+        self.generation = 0
+        self.timer = None  # handle of the pending refresh
+        self.holds = 0  # when > 0, refreshes are postponed
+        self.postponed = False
+
+    def debounce(self):
+        """ Seconds to wait for further requests before refreshing. """
+        return self.ctrl.buffers.options['refresh#debounce'] / 1000.0
+
+    def request(self):
+        """ Ask for a refresh of the buffers, superseding any pending or running one. """
+        self.generation += 1
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.holds > 0:
+            self.postponed = True
+            return
+        self.timer = self.ctrl.vimx.loop.call_later(self.debounce(), self.start)
+
+    def cancel(self):
+        """ Drop the pending refresh, and make the running one stale. """
+        self.generation += 1
+        self.postponed = False
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def is_stale(self, generation):
+        return generation != self.generation
+
+    def start(self):
+        self.timer = None
+        task = asyncio.ensure_future(self.run(self.generation))
+        task.add_done_callback(self.finished)
+
+    async def run(self, generation):
+        async with self.ctrl.lock:  # in turn with the requests from Vim
+            if self.is_stale(generation) or self.ctrl.dbg is None \
+                    or self.ctrl.state.running:
+                return
+            start = time()
+            await self.ctrl.buffers.update(lambda: self.is_stale(generation))
+            self.ctrl.stats.record('refresh', 'stale' if self.is_stale(generation)
+                                   else 'done', time() - start)
+
+    def finished(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error('Refresh failed', exc_info=task.exception())
+
+    @contextmanager
+    def held(self):
+        """ Postpone refreshes until the end of the block, e.g. while running the
+            actions of a mode setup.
+        """
+        self.holds += 1
+        try:
+            yield
+        finally:
+            self.holds -= 1
+            if self.holds == 0 and self.postponed:
+                self.postponed = False
+                self.request()
@@ -1,14 +1,22 @@
 from __future__ import (absolute_import, division, print_function)
 
 from collections import OrderedDict
-from time import sleep
 from os import path, chdir
+import asyncio
 import json
+import re
+
+from .dispatcher import mi_quote
+from .warm import loaded_file
 
 __metaclass__ = type  # pylint: disable=invalid-name
 
 
 class Session:  # pylint: disable=too-many-instance-attributes
+    warm_defaults = {
+        "warm#enable": 0,  # keep gdb running between debug modes
+        "warm#index_cache": "",  # directory of gdb's index cache, if any
+    }
 
     def __init__(self, ctrl, vimx):
         import logging
@@ -21,6 +29,7 @@ class Session:  # pylint: disable=too-many-instance-attributes
         self.json_decoder = json.JSONDecoder(object_pairs_hook=OrderedDict)
         self.help_flags = {"new": False, "launch_prompt": True, "session_show": True}
         self.bpid_map = {}
+        self.warm = False  # whether gdb is parked rather than stopped after debug modes
 
     def isalive(self):
         """ Returns true if a well-defined session is alive """
@@ -29,17 +38,107 @@ class Session:  # pylint: disable=too-many-instance-attributes
     def new_target(self, target):
         self.bpid_map = {}
 
+    def bp_locations(self):
+        """ (file, line, options) of the breakpoints in the session state, where
+            `options` holds the condition etc. of the breakpoint, if any.
+        """
+        locations = []
+        for filepath, lines in self.state.get('breakpoints', {}).items():
+            for line in lines:
+                options = {}
+                if isinstance(line, dict):
+                    options = dict((k, v) for k, v in line.items() if k != 'line')
+                    line = line['line']
+                locations.append((path.join(self.internal.get("@dir", ''), filepath),
+                                  line, options))
+        return locations
+
+    def save_breakpoints(self):
+        """ Store the breakpoints of gdb in the session state, and write the session
+            file if they changed. A breakpoint is saved at the file and line it was
+            set at, or else at the location it resolved to (e.g. for a function);
+            its condition, ignore count and being disabled are saved along with
+            the line, as {"line": 12, "cond": "i > 2", "ignore": 3, "enabled": false}.
+        """
+        if not self.isalive() or self.ctrl.dbg is None:
+            return
+        bps = OrderedDict()
+        for number in sorted(self.ctrl.breakpoints.by_number, key=int):
+            bkpt = self.ctrl.breakpoints.by_number[number].bkpt
+            if 'breakpoint' not in bkpt.get('type', '') or bkpt.get('disp') == 'del':
+                continue  # watchpoints, catchpoints and temporary breakpoints
+            match = re.match(r'(?:-source )?(.+?):(?:-line )?(\d+)$',
+                             bkpt.get('original-location') or bkpt.get('pending', ''))
+            if match:
+                filepath, line = path.abspath(match.group(1)), int(match.group(2))
+            elif bkpt.get('fullname') and 'line' in bkpt:
+                filepath, line = bkpt['fullname'], int(bkpt['line'])
+            else:
+                self.logger.info('Breakpoint %s not saved: %s', number,
+                                 bkpt.get('original-location'))
+                continue
+            entry = OrderedDict([('line', line)])
+            if bkpt.get('cond'):
+                entry['cond'] = bkpt['cond']
+            if int(bkpt.get('ignore', 0)):
+                entry['ignore'] = int(bkpt['ignore'])
+            if bkpt.get('enabled') == 'n':
+                entry['enabled'] = False
+            if len(entry) == 1:
+                entry = line
+            lines = bps.setdefault(self.path_shorten(filepath), [])
+            if entry not in lines:
+                lines.append(entry)
+        if bps != self.state['breakpoints']:
+            self.state['breakpoints'] = bps
+            self.write_state()
+
+    def write_state(self):
+        """ Write the breakpoints of the session state to the session file. Other keys
+            are kept as they are in the file, which the user may have edited since it
+            was loaded; a new session is written whole.
+        """
+        state = self.state
+        if not self.internal.get('@new'):
+            try:
+                with open(self.get_confpath()) as f:
+                    state = self.parse(f.read())
+                state['breakpoints'] = self.state['breakpoints']
+            except IOError:
+                state = self.state  # the file is gone
+            except ValueError as e:
+                self.vimx.log("Session file not updated, as it is invalid: %s" % e)
+                return
+        try:
+            with open(self.get_confpath(), 'w') as f:
+                f.write(json.dumps(state, indent=4, separators=(',', ': ')) + '\n')
+            self.internal.pop('@new', None)
+        except IOError as e:
+            self.vimx.log("Cannot write the session file: %s" % e)
+
+    async def restore_breakpoints(self):
+        """ Set the breakpoints of the session state that are not set already. """
+        locations = [(filepath, line, options)
+                     for filepath, line, options in self.bp_locations()
+                     if not self.ctrl.breakpoints.at(filepath, line)]
+        if locations:
+            await self.ctrl.bp_insert(locations)
+
     def format(self, s):
         return s.format(**self.state['variables'])
 
-    def run_actions(self, actions):  # pylint: disable=too-many-branches
-        self.ctrl.busy_more()
-        for action in actions:
-            if isinstance(action, str):
-                self.ctrl.execute(self.format(action))
-            else:
-                self.logger.critical("Invalid action!")
-        self.ctrl.busy_less()
+    async def run_actions(self, actions):  # pylint: disable=too-many-branches
+        with self.ctrl.refresher.held():
+            for action in actions:
+                if isinstance(action, str):
+                    command = self.format(action)
+                    if self.ctrl.target_loaded(command):
+                        self.ctrl.buffers.logs_append(
+                            u'\u2192(gdb) {} (loaded already)\n'.format(command))
+                        continue
+                    await self.ctrl.execute(command)
+                else:
+                    self.logger.critical("Invalid action!")
 
     def get_modes(self):
         if 'modes' in self.state:
@@ -47,38 +146,45 @@ class Session:  # pylint: disable=too-many-instance-attributes
         else:
             return []
 
-    def mode_setup(self, mode):
+    async def mode_setup(self, mode):
         """ Tear down the current mode, and switch to a new one. """
         if mode not in self.get_modes():
             self.vimx.log("Invalid mode!")
             return
-        self.mode_teardown()
+        if mode.startswith('debug'):
+            await self.ctrl.standby_ready()
+        await self.mode_teardown()
         self.internal['@mode'] = mode
         self.vimx.command("call call(g:gdb#session#mode_setup, ['%s'])" % mode)
         if mode.startswith('debug'):
             self.ctrl.dbg_start()
+            await self.restore_breakpoints()
             if 'setup' in self.state['modes'][mode]:
-                self.run_actions(self.state['modes'][mode]['setup'])
-            self.ctrl.update_buffers()
+                await self.run_actions(self.state['modes'][mode]['setup'])
+            self.ctrl.refresher.request()
         if self.help_flags["new"] and \
                 self.help_flags["launch_prompt"] and \
                 self.internal['@mode'] == 'debug':
-            sleep(0.4)
-            if self.vimx.eval("input('Launch the target? [y=yes] ', 'y')") == 'y':
+            await asyncio.sleep(0.4)
+            if await self.vimx.eval("input('Launch the target? [y=yes] ', 'y')") == 'y':
                 self.state['modes']['debug']['setup'].append('run')
-                self.ctrl.execute('run')
+                await self.ctrl.execute('run')
                 self.vimx.log('Process launched! Try `:GGsession show`', 0)
             self.help_flags["launch_prompt"] = False
 
-    def mode_teardown(self):
+    async def mode_teardown(self):
         if self.isalive():
             mode = self.internal['@mode']
             if 'teardown' in self.state['modes'][mode]:
-                self.run_actions(self.state['modes'][mode]['teardown'])
+                await self.run_actions(self.state['modes'][mode]['teardown'])
+            self.save_breakpoints()
             self.vimx.command("call call(g:gdb#session#mode_teardown, ['%s'])" % mode)
             del self.internal['@mode']
-            if mode.startswith('debug'):
-                self.ctrl.dbg_stop()
+            if mode.startswith('debug') and self.ctrl.dbg is not None:
+                if self.warm:
+                    self.ctrl.dbg_park()
+                else:
+                    self.ctrl.dbg_stop()
             return True
         return False
 
@@ -89,7 +195,11 @@ class Session:  # pylint: disable=too-many-instance-attributes
             return None
 
     def path_shorten(self, abspath):
-        return path.relpath(abspath, self.internal["@dir"])
+        """ `abspath` relative to the session directory, unless it lies outside. """
+        relpath = path.relpath(abspath, self.internal["@dir"])
+        if relpath == path.pardir or relpath.startswith(path.pardir + path.sep):
+            return abspath
+        return relpath
 
     def set_path(self, confpath):
         head, tail = path.split(path.abspath(confpath))
@@ -105,7 +215,8 @@ class Session:  # pylint: disable=too-many-instance-attributes
         self.internal["@file"] = tail
         return True
 
-    def parse_and_load(self, conf_str):  # pylint: disable=too-many-branches
+    def parse(self, conf_str):  # pylint: disable=too-many-branches
+        """ Returns the session state defined by `conf_str`, or raises ValueError. """
         state = self.json_decoder.decode(conf_str)
         if not isinstance(state, dict):
             raise ValueError("The root object must be an associative array")
@@ -121,70 +232,130 @@ class Session:  # pylint: disable=too-many-instance-attributes
                 if len(state["modes"]) == 0:
                     raise ValueError("At least one mode has to be defined")
             elif key == "breakpoints":
-                pass
+                for lines in state[key].values():
+                    if not isinstance(lines, list) or \
+                            not all(self.valid_bp_line(line) for line in lines):
+                        raise ValueError('"breakpoints" must map files to lists of lines')
             else:
                 raise ValueError("Invalid key '%s'" % key)
 
             if not isinstance(state[key], dict):
                 raise ValueError('"%s" must be an associative array' % key)
 
-        self.mode_teardown()
+        return state
+
+    @staticmethod
+    def valid_bp_line(line):
+        """ Whether `line` is a line number, or a line with breakpoint options. """
+        if isinstance(line, dict):
+            return isinstance(line.get('line'), int) and \
+                isinstance(line.get('cond', ''), str) and \
+                isinstance(line.get('ignore', 0), int) and \
+                isinstance(line.get('enabled', True), bool) and \
+                set(line) <= set(['line', 'cond', 'ignore', 'enabled'])
+        return isinstance(line, int)
+
+    async def load(self, state, confpath):
+        """ Tear down the current session, and set up `state`, read from `confpath`. """
+        await self.mode_teardown()
+        if not self.set_path(confpath):  # breakpoint paths are relative to the session file
+            return False
+        self.internal.pop('@new', None)
         self.state = state
-        self.mode_setup(list(self.state["modes"].keys())[0])
+        await self.warm_up()
+        await self.mode_setup(list(self.state["modes"].keys())[0])
+        return True
 
-    def handle_new(self):
-        if self.isalive() and self.vimx.eval("gdb#session#discard_prompt()") == 0:
+    async def warm_up(self):
+        """ With g:gdb#warm#enable set, start gdb in the background, and load the
+            target of the debug modes into it, i.e. the file of their first `file`
+            setup action. Otherwise, stop the standby gdb, if any.
+        """
+        options = await self.vimx.get_options(self.warm_defaults)
+        self.warm = bool(options['warm#enable'])
+        self.ctrl.gdb_settings = []
+        if options['warm#index_cache']:
+            self.ctrl.gdb_settings = [
+                '-gdb-set index-cache directory {}'.format(
+                    mi_quote(path.expanduser(options['warm#index_cache']))),
+                '-gdb-set index-cache on']
+        target = self.warm_target() if self.warm else None
+        if target:
+            self.ctrl.standby_start(target)
+        else:
+            self.ctrl.standby_stop()
+
+    def warm_target(self):
+        """ The file loaded by the setup actions of the debug modes, if any. """
+        for mode, conf in self.state['modes'].items():
+            if not mode.startswith('debug'):
+                continue
+            for action in conf.get('setup', []):
+                try:
+                    filename = loaded_file(self.format(action))
+                except (KeyError, IndexError, AttributeError):
+                    continue  # the action is reported when run
+                if filename is not None:
+                    return filename
+        return None
+
+    async def handle_new(self):
+        if self.isalive() and await self.vimx.eval("gdb#session#discard_prompt()") == 0:
             self.vimx.log("Session left unchanged!", 0)
             return
 
-        ret = self.vimx.eval("gdb#session#new()")
+        ret = await self.vimx.eval("gdb#session#new()")
         if not ret or '_file' not in ret:
             self.vimx.log("Skipped -- no session was created!")
             return
-        if not self.set_path(ret["_file"]):
-            return
 
         try:
-            self.parse_and_load("""{
+            state = self.parse("""{
                 "variables": {},
                 "modes": {
                     "code": {},
                     "debug": {
-                        "setup": ["#source -v bps.gdb #note: commented out"],
-                        "teardown": ["#save breakpoints bps.gdb"]
+                        "setup": [],
+                        "teardown": []
                     }
-                }
+                },
+                "breakpoints": {}
             }""")
         except ValueError as e:
             self.vimx.log("Unexpected error: " + str(e))
             return
+        if not await self.load(state, ret["_file"]):
+            return
 
         if 'target' in ret and len(ret['target']) > 0:
             self.state["variables"]["target"] = \
-                self.path_shorten(self.vimx.abspath(ret["target"]))
+                self.path_shorten(await self.vimx.abspath(ret["target"]))
             debug = self.state["modes"]["debug"]
             debug["setup"].insert(0, "file {target}")
             self.help_flags["new"] = True
 
+        self.internal['@new'] = True  # not written yet
         self.vimx.log("New session created!", 0)
 
-    def handle_load(self, confpath):
-        if self.isalive() and self.vimx.eval("gdb#session#discard_prompt()") == 0:
+    async def handle_load(self, confpath):
+        if self.isalive() and await self.vimx.eval("gdb#session#discard_prompt()") == 0:
             self.vimx.log("Session left unchanged!", 0)
             return
 
+        # so that the file read has them, along with any changes made by the user
+        self.save_breakpoints()
         try:
             with open(confpath) as f:
-                self.parse_and_load(''.join(f.readlines()))
+                state = self.parse(''.join(f.readlines()))
         except (ValueError, IOError) as e:
             self.vimx.log("Bad session file: " + str(e))
-        else:
-            self.set_path(confpath)
+            return
+        if await self.load(state, confpath):
             self.vimx.log("Loaded %s" % confpath, 0)
 
-    def handle_show(self):
+    async def handle_show(self):
         if self.isalive():
-            sfile_bufnr = self.vimx.buffer_add(self.get_confpath())
+            sfile_bufnr = await self.vimx.buffer_add(self.get_confpath())
             self.vimx.command('exe "tab drop ".escape(bufname({0}), "$%# ")'
                               .format(sfile_bufnr))
 
@@ -203,26 +374,36 @@ class Session:  # pylint: disable=too-many-instance-attributes
         else:
             self.vimx.log("No active session.")
 
-    def handle(self, cmd, *args):
+    async def handle(self, cmd, *args):
         """ Handler for :GGsession commands. """
         if cmd == 'new':
-            self.handle_new()
-        elif cmd == 'relod':
+            await self.handle_new()
+        elif cmd == 'reload':
             if '@file' not in self.internal:
                 self.vimx.log("No active session!")
             elif len(args) > 0:
                 self.vimx.log("Too many arguments!")
             else:
-                self.handle_load(self.get_confpath())
+                await self.handle_load(self.get_confpath())
         elif cmd == 'load':
             if len(args) == 0:
-                confpath = self.vimx.eval('findfile(g:gdb#session#file, ".;")')
-                self.handle_load(confpath)
+                confpath = await self.vimx.eval('findfile(g:gdb#session#file, ".;")')
+                await self.handle_load(confpath)
             elif len(args) == 1:
-                self.handle_load(args[0])
+                await self.handle_load(args[0])
             else:
                 self.vimx.log("Too many arguments!")
         elif cmd == 'show':
-            self.handle_show()
+            await self.handle_show()
+        elif cmd == 'bp-save':
+            if self.ctrl.dbg is None:
+                self.vimx.log("Breakpoints can only be saved in debug mode!")
+            else:
+                self.save_breakpoints()
+        elif cmd == 'bp-set':
+            if self.ctrl.dbg is None:
+                self.vimx.log("Breakpoints can only be set in debug mode!")
+            else:
+                await self.restore_breakpoints()
         else:
             self.vimx.log("Invalid sub-command: %s" % cmd)
@@ -0,0 +1,96 @@
+# Timing statistics of the server: MI commands, Vim round-trips and pane
+# renders, kept in fixed-size histograms.
+
+from __future__ import (absolute_import, division, print_function)
+
+from math import log
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class Histogram:
+    """ Counts of durations in logarithmic buckets, from 10us up (each bucket is
+        about 19% wider than the previous one), so that percentiles can be told
+        within that precision in constant memory.
+    """
+    __slots__ = ('counts', 'count', 'total', 'max')
+    base = 1e-5  # upper bound of the first bucket, in seconds
+    growth = 2 ** 0.25
+    size = 100  # buckets; the last one holds durations above ~5 minutes
+
+    def __init__(self):
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        if seconds <= self.base:
+            index = 0
+        else:
+            index = min(int(log(seconds / self.base, self.growth)) + 1, self.size - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """ Upper bound of the bucket holding the given fraction of the durations. """
+        wanted = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= wanted:
+                return min(self.base * self.growth ** index, self.max)
+        return self.max
+
+    def summary(self):
+        """ Count, and durations in milliseconds. """
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1000 * self.percentile(0.5),
+            'p90_ms': 1000 * self.percentile(0.9),
+            'p99_ms': 1000 * self.percentile(0.99),
+            'max_ms': 1000 * self.max,
+        }
+
+
+class Stats:
+    """ Histograms by category ('mi', 'vim', 'pane', ...) and key, e.g. the name of
+        an MI command.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # maps (category, key) -> <Histogram object>
+
+    def clear(self):
+        self.histograms = {}
+
+    def record(self, category, key, seconds):
+        hist = self.histograms.get((category, key))
+        if hist is None:
+            hist = self.histograms[(category, key)] = Histogram()
+        hist.add(seconds)
+
+    def summary(self):
+        """ Maps category -> key -> summary of its histogram, e.g. for a JSON dump. """
+        summary = {}
+        for (category, key), hist in self.histograms.items():
+            summary.setdefault(category, {})[key] = hist.summary()
+        return summary
+
+    def lines(self):
+        """ A table of the histograms, the most time-consuming keys first. """
+        header = '{:<8} {:<40} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+            'category', 'key', 'count', 'mean ms', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms')
+        lines = [header]
+        for category in sorted(set(c for c, _ in self.histograms)):
+            keys = [k for c, k in self.histograms if c == category]
+            keys.sort(key=lambda k: -self.histograms[(category, k)].total)
+            for key in keys:
+                s = self.histograms[(category, key)].summary()
+                lines.append('{:<8} {:<40} {:>8} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}'
+                             .format(category, key[:40], s['count'], s['mean_ms'],
+                                     s['p50_ms'], s['p90_ms'], s['p99_ms'], s['max_ms']))
+        return lines
@@ -0,0 +1,105 @@
+# Threads pane: the ids of all threads, with the details (target id, name and
+# innermost frame) of the ones that are displayed or selected.
+
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+
+from .records import Thread
+from .renderer import thread_line
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class ThreadList:
+    """ Thread ids are listed with -thread-list-ids at every stop, which is cheap.
+        Details of up to `threads#details_max` threads (or `threads#signs_max`, for
+        the PC signs) are fetched with a single -thread-info; beyond that, only the
+        selected thread and the ones shown in the pane are fetched, with one
+        -thread-info per thread. Details are kept across stops for the threads that
+        were not resumed meanwhile.
+    """
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.logger = logging.getLogger(__name__)
+        self.ids = []  # ids of all threads, in ascending order
+        self.current = None  # id of the selected thread
+        self.records = {}  # maps thread id -> its Thread record
+        self.view = (0, 0)  # indexes in `ids` of the threads shown in the pane
+
+    def clear(self):
+        """ Forget everything, e.g. when gdb is stopped. """
+        self.ids = []
+        self.current = None
+        self.records = {}
+        self.view = (0, 0)
+
+    def resumed(self, thread_id):
+        """ Drop the details of the thread(s) set running by a *running record. """
+        if thread_id == 'all':
+            self.records = {}
+        else:
+            self.records.pop(thread_id, None)
+
+    def set_ids(self, result):
+        """ Update the list of threads, given the result of -thread-list-ids. """
+        if result is None or result['message'] != 'done':
+            return
+        payload = result['payload']
+        ids = (payload.get('thread-ids') or {}).get('thread-id', [])
+        if not isinstance(ids, list):  # a single thread
+            ids = [ids]
+        self.ids = sorted(ids, key=int)
+        self.current = payload.get('current-thread-id')
+        known = set(self.ids)
+        for tid in list(self.records):
+            if tid not in known:
+                del self.records[tid]
+
+    def wanted(self):
+        """ Ids of the threads whose details are to be shown. """
+        wanted = set()
+        if self.ctrl.buffers.is_visible('threads'):
+            wanted.update(self.ids[self.view[0]:self.view[1]])
+        for tid in (self.current, self.ctrl.state.thread_id):
+            if tid is not None:
+                wanted.add(tid)
+        return wanted
+
+    async def fetch(self, limit=None):
+        """ Fetch the missing details of the wanted threads, or of all threads if
+            there are at most `limit` of them (by default `threads#details_max`).
+            Returns whether anything was fetched.
+        """
+        if limit is None:
+            limit = self.ctrl.buffers.options['threads#details_max']
+        missing = [tid for tid in self.ids if tid not in self.records]
+        if len(self.ids) <= limit:
+            commands = ['-thread-info'] if missing else []
+        else:
+            wanted = self.wanted()
+            commands = ['-thread-info {}'.format(tid) for tid in missing if tid in wanted]
+        if not commands:
+            return False
+        for result in await self.ctrl.get_command_results(commands):
+            if result is not None and result['message'] == 'done':
+                for thread in result['payload'].get('threads', []):
+                    self.records[thread['id']] = Thread(thread)
+        return True
+
+    async def set_view(self, first, last):
+        """ Record the lines of the pane in view (1-based, inclusive), and fetch the
+            details of the threads shown there. Returns whether anything changed.
+        """
+        self.view = (max(first - 1, 0), last)
+        return await self.fetch()
+
+    def frames(self):
+        """ Maps the id of every thread with known details -> its innermost frame. """
+        return dict((tid, thread.frame) for tid, thread in self.records.items()
+                    if thread.frame is not None)
+
+    def lines(self):
+        return [thread_line(tid, self.records.get(tid), tid == self.current)
+                for tid in self.ids]
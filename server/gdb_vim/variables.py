@@ -0,0 +1,233 @@
+# Locals pane: a tree of GDB variable objects (varobjs), which are updated
+# incrementally after every stop, and expanded on demand.
+
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+
+from .dispatcher import mi_quote
+from .renderer import variable_line
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+
+class VarNode:
+    __slots__ = ('name', 'exp', 'type', 'value', 'numchild', 'has_more', 'children',
+                 'expanded')
+
+    def __init__(self, record, exp=None):
+        self.name = record['name']  # name of the varobj
+        self.exp = record.get('exp', exp)
+        self.type = record.get('type')
+        self.value = record.get('value')
+        self.numchild = int(record.get('numchild', 0))
+        self.has_more = record.get('has_more') == '1'  # dynamic varobjs only
+        self.children = None  # None until fetched
+        self.expanded = False
+
+    def expandable(self):
+        return self.numchild > 0 or self.has_more
+
+    def more_children(self):
+        """ Whether children beyond the fetched ones exist. """
+        if self.children is None:
+            return self.expandable()
+        return self.has_more or len(self.children) < self.numchild
+
+
+class Variables:
+    """ Watched expressions, followed by the locals of the selected frame.
+        Every local (and watch) is a floating varobj, so that it is evaluated in
+        the selected frame; after a stop only the varobjs reported by -var-update
+        are refreshed.
+    """
+    page_size = 100  # children fetched at a time
+
+    def __init__(self, ctrl):
+        self.ctrl = ctrl
+        self.logger = logging.getLogger(__name__)
+        self.locals = []  # list of ((name, occurrence), <VarNode object>)
+        self.watches = []  # list of <VarNode object>
+        self.nodes = {}  # maps varobj name -> <VarNode object>
+        self.line_map = []  # maps line index -> (<VarNode object>, is "more" line)
+
+    def clear(self):
+        """ Forget all varobjs, e.g. when gdb is restarted. """
+        self.locals = []
+        self.watches = []
+        self.nodes = {}
+        self.line_map = []
+
+    def release(self):
+        """ Forget all varobjs, and return the commands deleting them in gdb, e.g.
+            when gdb is parked between debug modes.
+        """
+        nodes = [node for _, node in self.locals] + self.watches
+        self.clear()
+        return ['-var-delete {}'.format(node.name) for node in nodes]
+
+    async def lines(self, result):
+        """ Returns the lines of the pane, given the result of
+            -stack-list-variables --no-values. The locals are dropped once there is
+            no frame, e.g. after the program exited.
+        """
+        if result is None or result['message'] != 'done':
+            await self.drop_locals()
+            return self.render()
+
+        keys = []  # (name, occurrence) pairs, as names may be shadowed
+        seen = {}
+        for var in result['payload']['variables']:
+            name = var['name']
+            seen[name] = seen.get(name, 0) + 1
+            keys.append((name, seen[name]))
+
+        old = dict(self.locals)
+        commands = []
+        for key, node in self.locals:
+            if key not in keys:
+                commands.append('-var-delete {}'.format(node.name))
+                self.forget(node)
+        commands.append('-var-update --all-values *')
+        created = [key for key in keys if key not in old]
+        commands += ['-var-create - @ {}'.format(key[0]) for key in created]
+
+        results = await self.ctrl.get_command_results(commands)
+        self.apply_changes(results[len(commands) - len(created) - 1])
+
+        new_nodes = {}
+        for key, res in zip(created, results[len(commands) - len(created):]):
+            if res is not None and res['message'] == 'done':
+                new_nodes[key] = self.remember(VarNode(res['payload'], key[0]))
+        self.locals = [(key, old.get(key) or new_nodes[key])
+                       for key in keys if key in old or key in new_nodes]
+
+        await self.refetch_expanded()
+        return self.render()
+
+    def remember(self, node):
+        self.nodes[node.name] = node
+        return node
+
+    async def drop_locals(self):
+        """ Forget the locals, and delete their varobjs. """
+        dropped, self.locals = self.locals, []
+        for _, node in dropped:
+            self.forget(node)
+        if dropped:
+            await self.ctrl.get_command_results(
+                ['-var-delete {}'.format(node.name) for _, node in dropped])
+
+    def forget(self, node):
+        """ Drop `node` and its descendants from the name map. """
+        self.nodes.pop(node.name, None)
+        for child in node.children or []:
+            self.forget(child)
+
+    def apply_changes(self, result):
+        """ Apply the changelist of -var-update. """
+        if result is None or result['message'] != 'done':
+            return
+        for change in result['payload']['changelist']:
+            node = self.nodes.get(change['name'])
+            if node is None:
+                continue
+            if change.get('in_scope') == 'false':
+                node.value = '<out of scope>'
+                continue
+            elif change.get('in_scope') == 'invalid':
+                node.value = '<invalid>'
+                continue
+            if 'value' in change:
+                node.value = change['value']
+            if change.get('type_changed') == 'true':
+                node.type = change.get('new_type', node.type)
+            if change.get('type_changed') == 'true' or 'new_num_children' in change:
+                node.numchild = int(change.get('new_num_children', node.numchild))
+                for child in node.children or []:
+                    self.forget(child)
+                node.children = None
+            if 'has_more' in change:
+                node.has_more = change['has_more'] == '1'
+
+    async def refetch_expanded(self):
+        """ Expanded nodes whose children were dropped get their first page back. """
+        stale = [node for node in self.nodes.values() if node.expanded and node.children is None]
+        while stale:
+            await self.fetch_children(stale)
+            stale = [child for node in stale for child in node.children or []
+                     if child.expanded and child.children is None]
+
+    async def fetch_children(self, nodes):
+        """ Fetch the next page of children for all `nodes` at once. """
+        commands = []
+        for node in nodes:
+            start = len(node.children or [])
+            commands.append('-var-list-children --all-values {} {} {}'.format(
+                node.name, start, start + self.page_size))
+        for node, res in zip(nodes, await self.ctrl.get_command_results(commands)):
+            if node.children is None:
+                node.children = []
+            if res is None or res['message'] != 'done':
+                node.has_more = False
+                node.numchild = len(node.children)
+                continue
+            for child in res['payload'].get('children', []):
+                node.children.append(self.remember(VarNode(child)))
+            node.has_more = res['payload'].get('has_more') == '1'
+
+    async def toggle(self, index):
+        """ Expand or collapse the node shown on line `index` (0-based), or fetch the
+            next page of children for a "more" line. Returns True if anything changed.
+        """
+        if not 0 <= index < len(self.line_map):
+            return False
+        node, is_more = self.line_map[index]
+        if is_more:
+            await self.fetch_children([node])
+        elif node.expandable():
+            node.expanded = not node.expanded
+            if node.expanded and node.children is None:
+                await self.fetch_children([node])
+        else:
+            return False
+        return True
+
+    async def add_watch(self, expr):
+        result = await self.ctrl.get_command_result('-var-create - @ {}'.format(mi_quote(expr)))
+        if result is None or result['message'] != 'done':
+            return False
+        self.watches.append(self.remember(VarNode(result['payload'], expr)))
+        return True
+
+    async def remove_watch(self, index):
+        """ Delete the watch shown on line `index`. Returns True if there was one. """
+        if not 0 <= index < len(self.line_map):
+            return False
+        node = self.line_map[index][0]
+        if node not in self.watches:
+            return False
+        self.watches.remove(node)
+        self.forget(node)
+        await self.ctrl.get_command_result('-var-delete {}'.format(node.name))
+        return True
+
+    def render(self):
+        lines = []
+        self.line_map = []
+
+        def add(node, depth):
+            lines.append(variable_line(node, depth))
+            self.line_map.append((node, False))
+            if node.expanded:
+                for child in node.children or []:
+                    add(child, depth + 1)
+                if node.more_children():
+                    lines.append('{}  ... more'.format('  ' * depth))
+                    self.line_map.append((node, True))
+
+        for node in self.watches:
+            add(node, 0)
+        for _, node in self.locals:
+            add(node, 0)
+        return lines
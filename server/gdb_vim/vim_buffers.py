@@ -1,27 +1,44 @@
 # Manages Vim user interface.
 #
-# TODO: display watched expressions
 # TODO: define interface for interactive panes, like catching enter
 #        presses to change selected frame/thread...
 
 from __future__ import (absolute_import, division, print_function)
 
+from collections import deque
+from io import open
+import asyncio
 from os import path
 from sys import stderr
-from .vim_signs import BPSign, PCSign
+from time import time
+from .backtrace import Backtrace
+from .disassembly import Disassembly
+from .pc_tracker import PCTracker
+from .registers import Registers
+from .renderer import record_text
+from .threads import ThreadList
+from .variables import Variables
+from .vim_signs import BPSign
 
 __metaclass__ = type  # pylint: disable=invalid-name
 
 
 class VimBuffers:  # pylint: disable=too-many-instance-attributes
     content_map = {
-        "backtrace": "-stack-list-frames",
-        "breakpoints": "-break-list",
-        "disassembly": "-data-disassemble -f ab.c -l 1 -- 0",
-        "threads": "-thread-info",
-        "locals": "-stack-list-variables --frame 0 --simple-values",
-        "registers": "-data-list-register-values 0 1 2 3 4 5 6 7"
+        "backtrace": None,  # fetched a page at a time, see Backtrace
+        "disassembly": "-stack-info-frame",
+        "threads": None,  # listed by the PC tracker, see ThreadList
+        "locals": "-stack-list-variables --no-values",
+        "registers": "-data-list-changed-registers"
     }
+    option_defaults = {
+        "logs#max_lines": 10000,  # lines kept in the logs buffer (0 = unbounded)
+        "logs#spill_file": "",  # lines dropped from the logs buffer are appended here
+        "refresh#debounce": 50,  # milliseconds to wait for further stops before a refresh
+        "threads#details_max": 64,  # above this many threads, only some are detailed
+        "threads#signs_max": 1024,  # above this many threads, only some get a PC sign
+    }
+    logs_interval = 0.05  # minimum seconds between two appends to the logs buffer
 
     def __init__(self, ctrl, vimx):
         """ Declare VimBuffers state variables """
@@ -31,20 +48,45 @@ class VimBuffers:  # pylint: disable=too-many-instance-attributes
         self.logger = logging.getLogger(__name__)
 
         self.buf_map = {}
+        self.options = dict(self.option_defaults)
+        self.backtrace = Backtrace(ctrl)
+        self.disassembly = Disassembly(ctrl)
+        self.registers = Registers(ctrl)
+        self.variables = Variables(ctrl)
+        self.threads = ThreadList(ctrl)
+        self.pcs = PCTracker(ctrl, vimx, self.threads)
+        self.visible = None  # names of displayed panes; None if not known yet
+        self.dirty = set()  # hidden panes that missed an update
+
+        self.buf_init_task = None
+        self.logs_pending = []  # lines waiting for the next append
+        self.logs_next_flush = 0
+        self.logs_timer = None  # handle of the scheduled logs_flush
+        self.logs_ring = None  # last lines sent to the logs buffer, if spilling
+        self.logs_spill_file = None
 
         # Currently shown signs
-        self.bp_signs = {}  # maps (bufnr, line) -> <BPSign object>
-        self.pc_signs = {}
-        self.pc_cur_loc = None
+        self.bp_signs = {}  # maps (file, line) -> <BPSign object>
+        self.bp_version = None  # version of the breakpoint index shown in the pane
+        self.bp_task = None
 
     def buf_check_init(self):
-        if not self.buf_map:
-            self.buf_map = self.vimx.init_buffers()
+        """ Create the gdb buffers, unless done already. Returns an awaitable. """
+        if self.buf_init_task is None:
+            self.buf_init_task = asyncio.ensure_future(self.buf_init())
+        return asyncio.shield(self.buf_init_task)
 
-    def logs_append(self, outstr, prefix=None):
-        """ Returns the number lines appended """
-        self.buf_check_init()
+    async def buf_init(self):
+        self.buf_map = await self.vimx.init_buffers()
+        self.options = await self.vimx.get_options(self.option_defaults)
+        if self.options['logs#spill_file']:
+            self.logs_ring = deque(maxlen=self.options['logs#max_lines'] or None)
+        self.logs_schedule()
 
+    def logs_append(self, outstr, prefix=None):
+        """ Queue lines for the logs buffer, which is appended to at most once every
+            `logs_interval` seconds. Returns the number lines appended
+        """
         if len(outstr) == 0:
             return 0
         lines = outstr.replace('\r\n', '\n').split('\n')
@@ -53,87 +95,226 @@ class VimBuffers:  # pylint: disable=too-many-instance-attributes
             if len(last_line) > 0:
                 last_line = prefix + last_line
             lines = [prefix + line for line in lines[:-1]] + [last_line]
-        print('\n'.join(lines), file=stderr)
-        stderr.flush()
-        #self.vimx.update_noma_buffer(self.buf_map['logs'], lines, append=True)
-        self.vimx.buffer_scroll_bottom(self.buf_map['logs'])
-        return len(lines) - 1
-
-    def update_pc(self):  # pylint: disable=too-many-branches
-        """ Place the PC sign on the PC location of each thread's selected frame.
-            If the 'selected' PC location has changed, jump to it.
+        count = len(lines) - 1
+        if len(lines[-1]) == 0:
+            lines.pop()
+        self.logs_pending.extend(lines)
+        self.logs_schedule()
+        return count
+
+    def logs_schedule(self):
+        """ Set a timer for flushing the queued lines, once the logs buffer exists. """
+        if not self.buf_map:
+            self.buf_check_init()
+        elif self.logs_pending and self.logs_timer is None:
+            self.logs_timer = self.vimx.loop.call_later(
+                max(self.logs_next_flush - time(), 0), self.logs_flush)
+
+    def logs_flush(self):
+        """ Append all queued lines to the logs buffer in a single message. """
+        self.logs_timer = None
+        if not self.logs_pending:
+            return
+        lines, self.logs_pending = self.logs_pending, []
+        self.logs_next_flush = time() + self.logs_interval
+        if not self.vimx.can_diff:  # no appendbufline(); use the job's err_io buffer
+            print('\n'.join(lines), file=stderr)
+            stderr.flush()
+            self.vimx.buffer_scroll_bottom(self.buf_map['logs'])
+            return
+        if self.logs_ring is not None:
+            self.logs_spill(lines)
+        self.vimx.call('gdb#layout#logs_append', self.buf_map['logs'], lines,
+                       self.options['logs#max_lines'], reply=False)
+
+    def logs_spill(self, lines):
+        """ Write the lines about to be dropped from the logs buffer to the spill file. """
+        ring = self.logs_ring
+        spilled = []
+        if ring.maxlen is not None:
+            overflow = len(ring) + len(lines) - ring.maxlen
+            spilled = [ring[i] for i in range(min(overflow, len(ring)))]
+            if overflow > len(ring):
+                spilled += lines[:overflow - len(ring)]
+        ring.extend(lines)
+        if not spilled:
+            return
+        try:
+            if self.logs_spill_file is None:
+                self.logs_spill_file = open(self.options['logs#spill_file'], 'a',
+                                            encoding='utf8')
+            self.logs_spill_file.write(u'\n'.join(spilled) + u'\n')
+            self.logs_spill_file.flush()
+        except IOError as e:
+            self.logger.warning('Cannot spill logs: %s', e)
+            self.logs_ring = None
+
+    def bp_pending(self, key, bufnr):
+        """ Show the sign at `key`, i.e. (file, line), as pending until bp_settle. """
+        sign = self.bp_signs.get(key)
+        if sign is None:
+            self.bp_signs[key] = BPSign(self.vimx, bufnr, key[1], pending=True)
+        else:
+            sign.set_pending(True)
+
+    def bp_settle(self, key):
+        """ Confirm or roll back the pending sign at `key`, depending on whether the
+            breakpoint index has a breakpoint there.
         """
+        sign = self.bp_signs.get(key)
+        if sign is None or not sign.pending:
+            return
+        if key in self.ctrl.breakpoints.by_key:
+            sign.set_pending(False)
+        else:
+            self.bp_signs.pop(key).hide()
 
-        pc_list = self.ctrl.get_program_counters()
+    def breakpoints_changed(self):
+        """ Reconcile the breakpoint signs and pane with the breakpoint index soon. """
+        if self.bp_task is None or self.bp_task.done():
+            self.bp_task = asyncio.ensure_future(self.update_breakpoints())
 
-        # Clear all existing PC signs
-        for sign in self.pc_signs.values():
-            sign.hide()
-        self.pc_signs = {}
+    async def update_breakpoints(self):
+        """ Place or remove signs only at the locations that gained or lost all their
+            breakpoints, and redraw the breakpoints pane if anything changed.
+            Multi-location breakpoints that gdb reported incompletely are fetched again.
+        """
+        index = self.ctrl.breakpoints
+        await self.buf_check_init()
+        while index.incomplete or index.changed or self.bp_version != index.version:
+            if index.incomplete:
+                numbers = sorted(index.incomplete, key=int)
+                index.incomplete.clear()
+                results = await self.ctrl.get_command_results(
+                    ['-break-info {}'.format(number) for number in numbers])
+                for result in results:
+                    if result is not None and result['message'] == 'done':
+                        index.add_table(result['payload']['BreakpointTable'])
 
-        for filepath, line, is_selected in pc_list:
-            self.logger.info("Got pc loc: %s", repr(loc))
-            if path_exists(filepath):
-                bufnr = self.vimx.buffer_add(filepath)
-            else:
-                continue
-
-            key = (bufnr, line)
-            if key in self.pc_signs: # already added in a previous iteration
-                if is_selected:
-                    self.pc_signs[key].hide()
-                else:
-                    continue
-
-            sign = PCSign(self.vimx, bufnr, line, is_selected)
-            self.pc_signs[key] = sign
-
-            if is_selected and self.pc_cur_loc != key:
-                self.vimx.sign_jump(bufnr, sign.id)
-                self.pc_cur_loc = key
-
-    def update_breakpoints(self, hard_update=False):
-        """ Decorates buffer with signs corresponding to breakpoints. """
-
-        bp_list = self.ctrl.get_breakpoints()
-
-        new_bps = set()
-        for filepath, line, bpid in bp_list:
-            if filepath and path.exists(filepath):
-                bufnr = self.vimx.buffer_add(filepath)
-                key = (bufnr, line)
-                new_bps.add(key)
-
-        # Hide all (outdated) breakpoint signs
-        for key, sign in self.bp_signs.copy().items():
-            if hard_update or key not in new_bps:
-                sign.hide()
-                del self.bp_signs[key]
-            else:
-                if bp_signs[key].hidden:
-                    bp_signs[key].show()
-                new_bps.discard(key)
+            for key, present in index.take_changes().items():
+                filepath, line = key
+                if present and key not in self.bp_signs and path.exists(filepath):
+                    bufnr = await self.vimx.buffer_add(filepath)
+                    if key not in self.bp_signs:
+                        self.bp_signs[key] = BPSign(self.vimx, bufnr, line)
+                elif not present and key in self.bp_signs:
+                    self.bp_signs.pop(key).hide()
 
-        # Show all (new) breakpoint signs
-        for (bufnr, line) in new_bps:
-            self.bp_signs[(bufnr, line)] = BPSign(
-                self.vimx, bufnr, line, (bufnr, line) in self.pc_signs)
+            if self.bp_version != index.version:
+                self.bp_version = index.version
+                self.vimx.update_noma_buffer(self.buf_map['breakpoints'], index.lines())
 
-    def update_buffer(self, buf):
-        self.buf_check_init()
+    async def render(self, buf, result):
+        """ Returns the lines to be shown in `buf`, given the result record. """
+        if buf == 'backtrace':
+            return await self.backtrace.lines(self.threads.current, self.pcs.level)
+        if buf == 'threads':
+            return self.threads.lines()
+        if buf == 'disassembly':
+            if result is None or result['message'] != 'done' or not result['payload']:
+                return []
+            return await self.disassembly.lines(result['payload']['frame'])
+        if buf == 'registers':
+            return await self.registers.lines(result)
+        if buf == 'locals':
+            return await self.variables.lines(result)
+        if result is None:
+            return []
+        return record_text(result)[0].splitlines()
 
-        command = self.content_map[buf]
-        result = self.ctrl.get_command_result(command)
-        result_lines = str(result).split('\n')
+    async def render_timed(self, buf, result):
+        """ Like render, but returns (bufnr, lines), and records the time taken. """
+        start = time()
+        lines = await self.render(buf, result)
+        self.ctrl.stats.record('pane', buf, time() - start)
+        return self.buf_map[buf], lines
 
-        if buf == 'breakpoints':
-            self.update_breakpoints()
+    async def disassembly_extend(self, direction):
+        """ Show more instructions above or below the disassembly window. """
+        lines = await self.disassembly.extend(direction)
+        if lines is not None:
+            self.vimx.update_noma_buffer(self.buf_map['disassembly'], lines)
 
-        self.vimx.update_noma_buffer(self.buf_map[buf], result_lines)
+    async def backtrace_more(self):
+        """ Show the next page of frames in the backtrace window. """
+        lines = await self.backtrace.more()
+        if lines is not None:
+            self.vimx.update_noma_buffer(self.buf_map['backtrace'], lines)
 
-    def update(self):
-        """ Updates signs, buffers, and possibly jumps to pc. """
-        self.update_pc()
+    async def threads_view(self, first, last):
+        """ Show the details of the threads in lines `first` to `last` of the threads
+            window.
+        """
+        if self.ctrl.dbg is None or self.ctrl.state.running:
+            return
+        if await self.threads.set_view(first, last):
+            self.vimx.update_noma_buffer(self.buf_map['threads'], self.threads.lines())
+
+    async def update_buffers(self, bufs, is_stale=None):
+        """ Fetch the contents of all `bufs` with a single write to gdb, and push them
+            to Vim in a single message, unless `is_stale()` is true by then. The panes
+            are rendered concurrently, so that the commands they need next are also
+            sent to gdb together.
+        """
+        await self.buf_check_init()
+
+        commands = [self.content_map[buf] for buf in bufs if self.content_map[buf]]
+        results = iter(await self.ctrl.get_command_results(commands))
+
+        updates = await asyncio.gather(*[
+            self.render_timed(buf, next(results) if self.content_map[buf] else None)
+            for buf in bufs])
+        if is_stale is not None and is_stale():
+            self.logger.debug('Dropped a stale update of %s', bufs)
+            return
+        self.vimx.update_noma_buffers(updates)
+
+    async def variables_toggle(self, lnum):
+        """ Expand/collapse the variable at line `lnum` of the locals pane. """
+        if await self.variables.toggle(lnum - 1):
+            self.vimx.update_noma_buffer(self.buf_map['locals'], self.variables.render())
+
+    async def watch_add(self, expr):
+        if await self.variables.add_watch(expr):
+            self.vimx.update_noma_buffer(self.buf_map['locals'], self.variables.render())
+        else:
+            self.vimx.log('Cannot watch "{}"'.format(expr))
+
+    async def watch_remove(self, lnum):
+        if await self.variables.remove_watch(lnum - 1):
+            self.vimx.update_noma_buffer(self.buf_map['locals'], self.variables.render())
 
+    def is_visible(self, buf):
+        return self.visible is None or buf in self.visible
+
+    async def set_visible(self, bufs):
+        """ Record the panes displayed in Vim, and fetch the ones that went stale
+            while they were hidden (unless the inferior is running).
+        """
+        self.visible = set(bufs)
+        if self.ctrl.dbg is None or self.ctrl.state.running:
+            return
+        stale = [buf for buf in self.content_map if buf in self.dirty and buf in self.visible]
+        self.dirty.difference_update(stale)
+        if stale:
+            await self.update_buffers(stale)
+
+    async def update(self, is_stale=None):
+        """ Updates signs, visible buffers, and possibly jumps to pc.
+            Hidden buffers are marked dirty, and are updated once they are displayed.
+            Gives up as soon as `is_stale()` is true.
+        """
+        await self.pcs.update()
+        if is_stale is not None and is_stale():
+            return
+
+        bufs = []
         for buf in self.content_map:
-            self.update_buffer(buf)
+            if self.is_visible(buf):
+                bufs.append(buf)
+                self.dirty.discard(buf)
+            else:
+                self.dirty.add(buf)
+
+        if bufs:
+            await self.update_buffers(bufs, is_stale)
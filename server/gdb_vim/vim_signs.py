@@ -7,6 +7,7 @@ __metaclass__ = type  # pylint: disable=invalid-name
 
 class VimSign:
     SIGN_BREAKPOINT = "llsign_bpres"
+    SIGN_BREAKPOINT_PENDING = "llsign_bppend"
     SIGN_PC_SELECTED = "llsign_pcsel"
     SIGN_PC_UNSELECTED = "llsign_pcunsel"
 
@@ -37,10 +38,20 @@ class VimSign:
 
 
 class BPSign(VimSign):
+    # pylint: disable=too-many-arguments
 
-    def __init__(self, vimx, bufnr, line, hidden=False):
-        name = VimSign.SIGN_BREAKPOINT
+    def __init__(self, vimx, bufnr, line, hidden=False, pending=False):
+        self.pending = pending
+        name = VimSign.SIGN_BREAKPOINT_PENDING if pending else VimSign.SIGN_BREAKPOINT
         super(BPSign, self).__init__(vimx, name, bufnr, line, hidden)
+    # pylint: enable=too-many-arguments
+
+    def set_pending(self, pending):
+        """ Switch between the pending and the regular breakpoint sign. """
+        self.pending = pending
+        self.name = VimSign.SIGN_BREAKPOINT_PENDING if pending else VimSign.SIGN_BREAKPOINT
+        if not self.hidden:
+            self.vimx.sign_change(self.id, self.name, self.bufnr)
 
 
 class PCSign(VimSign):
@@ -51,3 +62,10 @@ class PCSign(VimSign):
         name = VimSign.SIGN_PC_SELECTED if selected else VimSign.SIGN_PC_UNSELECTED
         super(PCSign, self).__init__(vimx, name, bufnr, line, hidden)
     # pylint: enable=too-many-arguments
+
+    def set_selected(self, selected):
+        """ Switch between the selected and the unselected PC sign. """
+        self.selected = selected
+        self.name = VimSign.SIGN_PC_SELECTED if selected else VimSign.SIGN_PC_UNSELECTED
+        if not self.hidden:
+            self.vimx.sign_change(self.id, self.name, self.bufnr)
@@ -1,75 +1,131 @@
 from __future__ import (absolute_import, division, print_function)
 
-from os import path
+from difflib import SequenceMatcher
+from os import path, read
+from time import time
+import asyncio
 import logging
 import json
 
+from .stats import Stats
+
 __metaclass__ = type  # pylint: disable=invalid-name
 
 
-class VimX:
+class VimX:  # pylint: disable=too-many-instance-attributes
+    batch_size = 512  # queued messages that trigger a flush
 
     def __init__(self, ch_in, ch_out):
         self.ch_in = ch_in
         self.ch_out = ch_out
+        self.loop = None  # the asyncio event loop, once started
         self.counter = -1
-        self.buffer = [] # buffer for 'positive' objects
+        self.events = None  # queue of 'positive' objects, i.e. requests from Vim
+        self.replies = {}  # maps negative index -> (<asyncio.Future object>, key, time sent)
+        self.partial = b''  # incomplete line read from ch_in
         self.logger = logging.getLogger(__name__)
-        self.buffer_cache = {}
-
-    def wait(self, expect=0):
-        """ Blocking function. Use with care!
-            `expect` should either be 0 or a negative number. If `expect == 0`, any positive
-            indexed object is returned. Otherwise, it will queue any positive objects until the
-            first negative object is received. If the received negative object does not match
-            `expect`, then a ValueError is raised.
+        self.buffer_cache = {}  # maps bufnr -> lines last sent to the buffer
+        self.bufnr_cache = {}  # maps buffer name -> bufnr
+        self.bufpath_cache = {}  # maps bufnr -> full path of its file
+        self.queue = []  # ex commands and calls not yet sent to Vim
+        self.can_diff = False  # whether Vim can edit buffers without switching to them
+        self.stats = Stats()  # timings of the server, see :GGstats
+
+    def start(self, loop):
+        """ Start reading from Vim, on the (running) asyncio event `loop`. """
+        self.loop = loop
+        self.events = asyncio.Queue()
+        loop.add_reader(self.ch_in.fileno(), self.read)
+
+    def read(self):
+        """ Read whatever Vim has sent, resolving the futures of replies, and queueing
+            requests in `events`; None is queued once Vim closes the channel.
+            Called by the event loop when ch_in is readable.
         """
-        if expect > 0:
-            raise AssertionError('expect <= 0')
-        if expect == 0 and len(self.buffer) > 0:
-            return self.pop()
-        while True:
-            s = self.ch_in.readline()
-            self.logger.info("read: %s", s)
-            ind, obj = json.loads(s)
-            if (expect == 0 and ind < 0) or (expect < 0 and expect != ind):
-                raise ValueError('Incorrect index received! {} != {}', expect, ind)
-            elif expect < 0 and ind > 0:
-                self.buffer.insert(0, obj)
+        data = read(self.ch_in.fileno(), 65536)
+        if not data:
+            self.loop.remove_reader(self.ch_in.fileno())
+            self.events.put_nowait(None)
+            return
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        for s in lines:
+            if debug:
+                self.logger.debug("read: %s", s)
+            ind, obj = json.loads(s.decode('utf8'))
+            if ind > 0:
+                self.events.put_nowait(obj)
+            elif ind in self.replies:
+                future, key, sent = self.replies.pop(ind)
+                self.stats.record('vim', key, time() - sent)
+                if not future.done():  # unless its waiter was cancelled
+                    future.set_result(obj)
             else:
-                break
-        return obj
+                self.logger.warning('Unexpected reply index: %s', ind)
 
     def write(self, obj):
         s = json.dumps(obj)
         print(s, file=self.ch_out) # with line break
         self.ch_out.flush()
-        self.logger.info("write: %s", s)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("write: %s", s)
 
     def send(self, obj):
         self.write([0, obj])
 
+    def enqueue(self, obj):
+        """ Queue a message that expects no reply. Queued messages are flushed at the
+            end of the current iteration of the event loop; see flush.
+        """
+        if not self.queue:
+            self.loop.call_soon(self.flush)
+        self.queue.append(obj)
+        if len(self.queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """ Send all queued messages, as a single message if there are several. """
+        if not self.queue:
+            return
+        queue, self.queue = self.queue, []
+        if len(queue) == 1:
+            self.write(queue[0])
+        else:
+            self.write(['call', 'gdb#util#batch', [queue]])
+
+    def request(self, obj):
+        """ Send `obj` right after the queued messages, and return a future for the
+            reply of Vim.
+        """
+        self.flush()
+        self.counter -= 1
+        future = self.loop.create_future()
+        key = obj[1] if obj[0] == 'call' else obj[1].split('(', 1)[0] + '()'
+        self.replies[self.counter] = (future, key, time())
+        self.write(obj + [self.counter])
+        return future
+
     def call(self, fname, *args, reply=True):
+        """ Call a Vim function. Returns a future for its result, which is to be
+            awaited, or None if `reply` is False.
+        """
         obj = ['call', fname, args]
-        if reply:
-            self.counter -= 1
-            obj += [self.counter]
-        self.write(obj)
-        if reply:
-            return self.wait(expect=self.counter)
+        if not reply:
+            self.enqueue(obj)
+            return None
+        return self.request(obj)
 
     def eval(self, expr, reply=True):
+        """ Like call, but evaluates a Vim expression. """
         obj = ['expr', expr]
-        if reply:
-            self.counter -= 1
-            obj += [self.counter]
-        self.write(obj)
-        if reply:
-            return self.wait(expect=self.counter)
+        if not reply:
+            self.enqueue(obj)
+            return None
+        return self.request(obj)
 
     def command(self, cmd):
-        obj = ['ex', cmd]
-        self.write(obj)
+        self.enqueue(['ex', cmd])
 
     def log(self, msg, level=1):
         """ Execute echom in vim using appropriate highlighting. """
@@ -77,12 +133,35 @@ class VimX:
         msg = msg.strip().replace('"', '\\"').replace('\n', '\\n')
         self.command('echohl {} | echom "{}" | echohl None'.format(level_map[level], msg))
 
-    def buffer_add(self, name):
+    async def buffer_add(self, name):
         """ Create a buffer (if it doesn't exist) and return its number. """
-        bufnr = self.call('bufnr', name, 1)
+        if name in self.bufnr_cache:
+            return self.bufnr_cache[name]
+        bufnr = await self.call('bufnr', name, 1)
         self.call('setbufvar', bufnr, '&bl', 1, reply=False)
+        self.bufnr_cache[name] = bufnr
         return bufnr
 
+    async def buffer_path(self, bufnr):
+        """ Full path of the file in buffer `bufnr` ('' if it has no name). """
+        if bufnr not in self.bufpath_cache:
+            self.bufpath_cache[bufnr] = await self.eval("expand('#{}:p')".format(int(bufnr)))
+        return self.bufpath_cache[bufnr]
+
+    def buffer_forget(self, bufnr):
+        """ Drop cached information about a wiped out (or renamed) buffer. """
+        self.buffer_cache.pop(bufnr, None)
+        self.bufpath_cache.pop(bufnr, None)
+        for name, nr in list(self.bufnr_cache.items()):
+            if nr == bufnr:
+                del self.bufnr_cache[name]
+
+    async def get_options(self, defaults):
+        """ Returns `defaults` updated with the values of the corresponding g:gdb#{key}
+            variables that are set in Vim.
+        """
+        return await self.call('gdb#util#options', defaults)
+
     def buffer_scroll_bottom(self, bufnr):
         """ Scroll to bottom for every window that displays the given buffer in the current tab """
         self.call('gdb#util#buffer_do', bufnr, 'normal! G', reply=False)
@@ -95,31 +174,47 @@ class VimX:
         """ Place a sign at the specified location. """
         self.command("sign place {} name={} line={} buffer={}".format(sign_id, name, line, bufnr))
 
+    def sign_change(self, sign_id, name, bufnr):
+        """ Change the sign placed with the specified id to another one. """
+        self.command("sign place {} name={} buffer={}".format(sign_id, name, bufnr))
+
     def sign_unplace(self, sign_id):
         """ Hide a sign with specified id. """
         self.command("sign unplace {}".format(sign_id))
 
-    def get_buffer_name(self, nr): # FIXME?
-        """ Get the buffer name given its number. """
-        return self.call('bufname', nr)
-
-    def abspath(self, relpath):
-        vim_cwd = self.call("getcwd")
+    async def abspath(self, relpath):
+        vim_cwd = await self.call("getcwd")
         return path.join(vim_cwd, relpath)
 
-    def init_buffers(self):
+    async def init_buffers(self):
         """ Create all gdb buffers and initialize the buffer map. """
-        return self.call('gdb#layout#init_buffers')
+        self.can_diff = await self.eval("exists('*bufload')") == 1
+        return await self.call('gdb#layout#init_buffers')
+
+    @staticmethod
+    def buffer_hunks(old, new):
+        """ Returns a short list of [start, end, lines] hunks that turn `old` into `new`. """
+        matcher = SequenceMatcher(None, old, new, autojunk=False)
+        return [[i1, i2, new[j1:j2]]
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
 
     def update_noma_buffer(self, bufnr, content):  # noma => nomodifiable
-        has_mod = True
-        if bufnr in self.buffer_cache \
-                and len(content) == len(self.buffer_cache[bufnr]):
-            has_mod = False
-            for l1, l2 in zip(content, self.buffer_cache[bufnr]):
-                if l1 != l2:
-                    has_mod = True
-                    break
-
-        if has_mod:
-            self.call('gdb#layout#update_buffer', bufnr, content, reply=False)
+        self.update_noma_buffers([(bufnr, content)])
+
+    def update_noma_buffers(self, updates):
+        """ Update the content of several buffers using a single message.
+            `updates` is a list of (bufnr, content) pairs. Only the lines that differ
+            from the last update are sent, if Vim supports it.
+        """
+        hunk_list = []
+        for bufnr, content in updates:
+            content = content or ['']  # an emptied buffer still has a line
+            if self.can_diff and bufnr in self.buffer_cache:
+                hunks = self.buffer_hunks(self.buffer_cache[bufnr], content)
+                if hunks:
+                    hunk_list.append([bufnr, hunks])
+            elif self.buffer_cache.get(bufnr) != content:
+                hunk_list.append([bufnr, [[0, -1, content]]])
+            self.buffer_cache[bufnr] = content
+        if hunk_list:
+            self.call('gdb#layout#update_buffers', hunk_list, reply=False)
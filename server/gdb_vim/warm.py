@@ -0,0 +1,178 @@
+# Warm standby: a gdb kept running between debug modes with the symbols of the
+# target loaded, so that switching to a debug mode does not pay for them again.
+
+from __future__ import (absolute_import, division, print_function)
+
+from binascii import hexlify
+from collections import deque
+from os import path, stat
+import asyncio
+import logging
+import re
+import struct
+
+from .dispatcher import mi_quote
+
+__metaclass__ = type  # pylint: disable=invalid-name
+
+FILE_COMMAND = re.compile(r'\s*(?:file|-file-exec-and-symbols)(?:\s+(.*?))?\s*$')
+
+
+def loaded_file(command):
+    """ The file loaded by a `file` command: None if `command` is not one, and ''
+        if it unloads the current file.
+    """
+    match = FILE_COMMAND.match(command)
+    if match is None:
+        return None
+    filename = match.group(1) or ''
+    if len(filename) > 1 and filename[0] == filename[-1] == '"':
+        filename = filename[1:-1]
+    return filename
+
+
+def build_id(filename):
+    """ The GNU build-id of an ELF file, as a hex string, or None. """
+    try:
+        with open(filename, 'rb') as f:
+            header = bytearray(f.read(64))
+            if len(header) < 64 or header[:4] != b'\x7fELF':
+                return None
+            is64 = header[4] == 2
+            order = '<' if header[5] == 1 else '>'
+            if is64:
+                shoff, = struct.unpack_from(order + 'Q', header, 0x28)
+                shentsize, shnum = struct.unpack_from(order + 'HH', header, 0x3A)
+            else:
+                shoff, = struct.unpack_from(order + 'I', header, 0x20)
+                shentsize, shnum = struct.unpack_from(order + 'HH', header, 0x2E)
+            f.seek(shoff)
+            table = f.read(shentsize * shnum)
+            for index in range(shnum):
+                entry = index * shentsize
+                if struct.unpack_from(order + 'I', table, entry + 4)[0] != 7:
+                    continue  # not SHT_NOTE
+                if is64:
+                    offset, size = struct.unpack_from(order + 'QQ', table, entry + 0x18)
+                else:
+                    offset, size = struct.unpack_from(order + 'II', table, entry + 0x10)
+                f.seek(offset)
+                notes = f.read(size)
+                pos = 0
+                while pos + 12 <= len(notes):
+                    namesz, descsz, note_type = struct.unpack_from(order + 'III', notes, pos)
+                    desc = pos + 12 + ((namesz + 3) & ~3)
+                    if note_type == 3 and notes[pos + 12:pos + 12 + namesz] == b'GNU\0':
+                        return hexlify(notes[desc:desc + descsz]).decode('ascii')
+                    pos = desc + ((descsz + 3) & ~3)
+    except (IOError, OSError, struct.error):
+        pass
+    return None
+
+
+class Target:
+    """ A binary loaded into gdb, and what it looked like at the time. """
+    __slots__ = ('path', 'mtime', 'size', 'build_id')
+
+    def __init__(self, filename):
+        self.path = path.abspath(path.expanduser(filename))
+        try:
+            st = stat(self.path)
+            self.mtime, self.size = st.st_mtime, st.st_size
+        except OSError:
+            self.mtime = self.size = None
+        self.build_id = build_id(self.path)
+
+    def unchanged(self, filename=None):
+        """ Whether `filename` (by default, the same path) still holds this binary:
+            it has the same modification time and size, or else the same build-id,
+            e.g. after a rebuild that produced identical code.
+        """
+        if filename is not None and path.abspath(path.expanduser(filename)) != self.path:
+            return False
+        if self.size is None:
+            return False
+        try:
+            st = stat(self.path)
+        except OSError:
+            return False
+        if (st.st_mtime, st.st_size) == (self.mtime, self.size):
+            return True
+        return self.build_id is not None and build_id(self.path) == self.build_id
+
+
+class Standby:
+    """ A gdb process that runs in the background while no debug mode is on. Its
+        output is read and dropped; MI errors are logged. `loaded` is resolved
+        once all the commands written have been answered, with whether `target`
+        (the binary given to `load`) is loaded.
+    """
+
+    def __init__(self, dbg, loop):
+        self.logger = logging.getLogger(__name__)
+        self.dbg = dbg  # <GdbController object>, until released
+        self.loop = loop
+        self.target = None  # <Target object> whose symbols are loaded
+        self.commands = deque()  # commands written, waiting for their result
+        self.loaded = asyncio.Future()
+        self.loaded.set_result(True)
+        for fileno in dbg.read_list:
+            loop.add_reader(fileno, self.drain)
+
+    def alive(self):
+        return self.dbg is not None and self.dbg.gdb_process.poll() is None
+
+    def loading(self):
+        """ Whether the symbols of `target` are still being loaded. """
+        return any(c.startswith('-file-exec-and-symbols') for c in self.commands)
+
+    def write(self, commands):
+        if self.loaded.done():
+            self.loaded = asyncio.Future()
+        self.commands.extend(commands)
+        self.dbg.write('\n'.join(commands), 0, read_response=False)
+
+    def load(self, target, settings=()):
+        """ Apply the gdb `settings`, and load the symbols of `target`. """
+        self.target = target
+        self.write(list(settings) + ['-file-exec-and-symbols {}'.format(mi_quote(target.path))])
+
+    def drain(self):
+        """ Called by the event loop when the output of gdb is readable. """
+        try:
+            responses = self.dbg.get_gdb_response(timeout_sec=0, raise_error_on_timeout=False)
+        except ValueError as e:
+            self.logger.warning('Standby gdb error: %s', e)
+            return
+        if not responses and self.dbg.gdb_process.poll() is not None:
+            self.logger.warning('Standby gdb exited with %s', self.dbg.gdb_process.returncode)
+            self.release()
+            return
+        for resp in responses:
+            if resp['type'] != 'result' or not self.commands:
+                continue
+            command = self.commands.popleft()
+            if resp['message'] == 'error':
+                self.logger.info('(gdb-standby) %s: %s', command,
+                                 (resp.get('payload') or {}).get('msg'))
+                if command.startswith('-file-exec-and-symbols'):
+                    self.target = None
+            if not self.commands and not self.loaded.done():
+                self.loaded.set_result(self.target is not None)
+
+    def release(self):
+        """ Stop reading the output of gdb, and return its GdbController (None if
+            released already).
+        """
+        dbg, self.dbg = self.dbg, None
+        if dbg is not None:
+            for fileno in dbg.read_list:
+                self.loop.remove_reader(fileno)
+        if not self.loaded.done():
+            self.loaded.set_result(False)
+        return dbg
+
+    def stop(self):
+        dbg = self.release()
+        if dbg is not None:
+            dbg.exit()
@@ -1,29 +1,95 @@
+import argparse
+import importlib
 import logging
-from gdb_vim.vim_x import VimX
-from gdb_vim import Middleman
+import os
 import sys
+import time
+import traceback
 
-def main():
-    ch_in = sys.stdin
-    ch_out = sys.stdout
+STARTED = time.time()  # the server is imported after this, which takes most of the startup
+
+
+def main(ch_in=sys.stdin, ch_out=sys.stdout, started=STARTED, key='startup'):
+    import asyncio
+    from gdb_vim import Middleman
+    from gdb_vim.vim_x import VimX
     vimx = VimX(ch_in, ch_out)
+    vimx.stats.record('server', key, time.time() - started)
     try:
         print("Initializing...", file=sys.stderr)
         sys.stderr.flush()
-        Middleman(vimx).loop()
+        asyncio.run(Middleman(vimx).loop())
+    except EOFError:
+        pass  # Vim has gone away
     except:
-        import time, traceback
+        logging.exception('Server crashed')
         traceback.print_exc() # print traceback to stderr
     finally:
         print("Exited!", file=sys.stderr)
         sys.stderr.flush()
         time.sleep(2) # hope for vim to read
 
-if __name__ == '__main__':
-    handler = logging.FileHandler('/tmp/gdb.vim.log', 'w')
-    handler.formatter = logging.Formatter(
-        '%(asctime)s [%(levelname)s @ '
-        '%(filename)s:%(funcName)s:%(lineno)s] - %(message)s')
+
+def serve_connection(conn, accepted):
+    """ Serve the Vim instance at the other end of socket `conn` (in a child of
+        the daemon).
+    """
+    main(conn.makefile('rb', buffering=0), conn.makefile('w', encoding='utf-8'),
+         accepted, 'attach')
+
+
+def daemon(args):
+    """ Serve every Vim instance that connects to the socket at args.daemon from
+        a fork of this process, so that none of them waits for Python to start and
+        import the server.
+    """
+    try:
+        os.setsid()  # outlive the Vim instance that started the daemon
+    except OSError:
+        pass  # a process group leader already
+    from gdb_vim.daemon import Daemon
+    importlib.import_module('gdb_vim')
+    importlib.import_module('pygdbmi.gdbcontroller')  # imported lazily otherwise
+    Daemon(args.daemon, serve_connection, args.idle_timeout).run()
+
+
+def setup_logging(args):
+    """ By default, records are kept in memory, and written to the log file only
+        when an error is logged (see RingHandler). DEBUG records are only emitted
+        by the subsystems listed in --debug, e.g. `vim_x,dispatcher` or `all`.
+    """
+    from gdb_vim.ring_log import FORMAT, RingHandler
+    if args.log_mode == 'file':
+        handler = logging.FileHandler(args.log_file, 'w')
+    else:
+        open(args.log_file, 'w').close()
+        handler = RingHandler(args.log_file, args.ring_size)
+    handler.formatter = logging.Formatter(FORMAT)
     logging.root.addHandler(handler)
-    logging.root.setLevel(logging.DEBUG)
-    main()
+    logging.root.setLevel(logging.INFO)
+    for name in filter(None, args.debug.split(',')):
+        if name == 'all':
+            logging.getLogger('gdb_vim').setLevel(logging.DEBUG)
+        else:
+            logging.getLogger('gdb_vim.' + name).setLevel(logging.DEBUG)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='gdb.vim server')
+    parser.add_argument('--log-file', default='/tmp/gdb.vim.log')
+    parser.add_argument('--log-mode', choices=['ring', 'file'], default='ring',
+                        help='keep records in memory until an error, or write them all')
+    parser.add_argument('--ring-size', type=int, default=10000,
+                        help='records kept in memory, in ring mode')
+    parser.add_argument('--debug', default='',
+                        help='comma-separated modules of gdb_vim logging DEBUG records')
+    parser.add_argument('--daemon', metavar='SOCKET',
+                        help='serve the Vim instances connecting to this Unix socket')
+    parser.add_argument('--idle-timeout', type=int, default=3600,
+                        help='seconds without connections before the daemon exits (0 = never)')
+    args = parser.parse_args()
+    setup_logging(args)
+    if args.daemon:
+        daemon(args)
+    else:
+        main()
@@ -24,7 +24,7 @@ elseif name == 'backtrace'
   hi def link GGOtherFrame Comment
 elseif name == 'breakpoints'
   syn match GGBpId /^[0-9]\+/ contained
-  syn match GGBpParams /[a-z]\+ = \zs[^,]\+\|resolved/ contained
+  syn match GGBpParams /[a-z]\+ = \zs[^,]\+\|disabled/ contained
   syn match GGBpLine /^[0-9]\+: .*/ contains=GGBpId,GGBpParams
   syn match GGBpLocLine /^  [0-9]\+.[0-9]\+: .*/ contains=GGBpParams
 
@@ -33,12 +33,14 @@ elseif name == 'breakpoints'
   hi def link GGBpLine Statement
   hi def link GGBpLocLine Comment
 elseif name == 'locals'
-  syn match GGVarType /^(\zs.\+\ze)/ contained
-  syn match GGVarIdent /) \zs\i\+\ze = /
-  syn match GGVarLine /^([^=]\+\i\+ = .*/ contains=GGVarType,GGVarIdent
+  syn match GGVarType /^ *[-+ ] (\zs.\+\ze) / contained
+  syn match GGVarIdent /) \zs[^ ]\+\ze = /
+  syn match GGVarLine /^ *[-+ ] ([^=]\+[^ ]\+ = .*/ contains=GGVarType,GGVarIdent
+  syn match GGVarMore /^ *\.\.\. more$/
 
   hi def link GGVarType Type
   hi def link GGVarIdent Identifier
+  hi def link GGVarMore Comment
 elseif name == 'threads'
   syn match GGThreadNumber /thread \zs#[0-9]\+/ contained
   syn match GGThreadParams /[:,] [a-z ]\+ = \zs[^,]\+/ contained
@@ -51,11 +53,13 @@ elseif name == 'threads'
   hi def link GGOtherThread Comment
 elseif name == 'registers'
   syn match GGRegHex /0x[0-9a-f]\+/
-  syn match GGRegIdent /^ \+\zs\i\+\ze = /
+  syn match GGRegIdent /^[ *] \+\zs\i\+\ze = /
+  syn match GGRegChanged /^\* .*/ contains=GGRegIdent
   syn cluster GGRegLine contains=GGRegIdent,GGRegIdent
 
   hi def link GGRegHex Number
   hi def link GGRegIdent Identifier
+  hi def link GGRegChanged Special
 elseif name == 'disassembly'
   set syntax=asm
 endif
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+""" Step-latency benchmark of the gdb.vim server.
+
+    The server (server/main.py) is run over pipes, as Vim runs it, with this
+    script standing in for Vim, and test/fake_gdb.py standing in for gdb. For
+    every scenario, a session is loaded, the debug mode is set up, and `next`
+    is executed repeatedly. A step lasts from the `exec` message until the server
+    has been quiet for a while. Reported per scenario: p50/p99 latency until the
+    last message of the step (appends to the logs buffer are throttled, and
+    often come last) and until the last update of the panes and signs, and the
+    mean number of bytes sent to Vim and of MI commands issued per step.
+
+    Usage: python3 test/benchmark.py [--steps N] [--json FILE] [scenario ...]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import json
+import os
+import select
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+SERVER = os.path.join(TEST_DIR, '..', 'server', 'main.py')
+FAKE_GDB = os.path.join(TEST_DIR, 'fake_gdb.py')
+SOURCE = os.path.join(TEST_DIR, 'ab.c')
+
+SCENARIOS = {
+    'baseline': {},
+    'deep-stack': {'depth': 5000},
+    'many-threads': {'threads': 2000},
+    'huge-locals': {'locals': 2000, 'changed': 500},
+    'chatty': {'output': 400},  # below the flood threshold of the server
+}
+
+BUFFERS = ['backtrace', 'breakpoints', 'disassembly', 'locals', 'logs', 'registers',
+           'threads']
+
+
+class VimPeer:
+    """ Talks to the server over its stdin/stdout like Vim's JSON channel does,
+        answering the calls and expressions the server sends.
+    """
+
+    def __init__(self, workdir, scenario, options):
+        env = dict(os.environ, PATH=workdir + os.pathsep + os.environ.get('PATH', ''),
+                   GDB_VIM_BENCH_SCENARIO=json.dumps(scenario),
+                   GDB_VIM_BENCH_LOG=os.path.join(workdir, 'commands.log'))
+        self.log_path = env['GDB_VIM_BENCH_LOG']
+        self.stderr_path = os.path.join(workdir, 'stderr')
+        self.server_log_path = os.path.join(workdir, 'server.log')
+        self.proc = subprocess.Popen([sys.executable, SERVER, '--log-mode', 'file',
+                                      '--log-file', self.server_log_path],
+                                     cwd=workdir, env=env,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=open(self.stderr_path, 'w'))
+        self.options = options
+        self.seq = 0
+        self.pending = b''
+        self.bytes = 0  # received from the server so far
+        self.last_ui = None  # time of the last message not appending to the logs
+        self.bufnrs = {}
+
+    def send(self, *event):
+        self.seq += 1
+        self.write([self.seq, list(event)])
+
+    def write(self, msg):
+        self.proc.stdin.write((json.dumps(msg) + '\n').encode('utf8'))
+        self.proc.stdin.flush()
+
+    def answer(self, msg):
+        if msg[0] == 'call' and len(msg) > 3:
+            fname, args = msg[1], msg[2]
+            if fname == 'gdb#layout#init_buffers':
+                value = dict((name, i + 2) for i, name in enumerate(BUFFERS))
+            elif fname == 'gdb#util#options':
+                value = dict(args[0], **self.options)
+            elif fname == 'bufnr':
+                value = self.bufnrs.setdefault(args[0], 100 + len(self.bufnrs))
+            elif fname == 'getcwd':
+                value = TEST_DIR
+            else:
+                value = 0
+            self.write([msg[3], value])
+        elif msg[0] == 'expr' and len(msg) > 2:
+            expr = msg[1]
+            if expr.startswith('input('):
+                value = 'n'
+            elif expr.startswith('expand('):
+                value = SOURCE
+            else:
+                value = 1
+            self.write([msg[2], value])
+
+    def pump(self, quiet, timeout=60.0):
+        """ Read and answer messages until none arrives for `quiet` seconds. Returns
+            the time the last message arrived (None if there was none).
+        """
+        last = None
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            ready, _, _ = select.select([self.proc.stdout], [], [], quiet)
+            if not ready:
+                break
+            data = os.read(self.proc.stdout.fileno(), 1 << 16)
+            if not data:
+                break
+            last = time.time()
+            self.bytes += len(data)
+            lines = (self.pending + data).split(b'\n')
+            self.pending = lines.pop()
+            for line in lines:
+                msg = json.loads(line.decode('utf8'))
+                if msg[:2] != ['call', 'gdb#layout#logs_append']:
+                    self.last_ui = last
+                self.answer(msg)
+        return last
+
+    def commands(self):
+        """ Number of MI commands the fake gdb received so far. """
+        if not os.path.exists(self.log_path):
+            return 0
+        with open(self.log_path) as log:
+            return sum(1 for _ in log)
+
+    def errors(self):
+        """ Tracebacks the server wrote to its stderr or its log so far. """
+        found = []
+        for filename in (self.stderr_path, self.server_log_path):
+            if os.path.exists(filename):
+                with open(filename) as out:
+                    text = out.read()
+                if 'Traceback' in text:
+                    found.append(text[text.index('Traceback'):].strip())
+        return found
+
+    def close(self):
+        try:
+            self.send('exit')
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+class BenchmarkError(Exception):
+    """ The server could not run a scenario, e.g. as it cannot drive gdb. """
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+
+def run_scenario(scenario, steps, warmup, quiet, options):
+    workdir = tempfile.mkdtemp(prefix='gdb-vim-bench-')
+    try:
+        gdb = os.path.join(workdir, 'gdb')
+        with open(gdb, 'w') as script:
+            script.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(sys.executable, FAKE_GDB))
+        os.chmod(gdb, os.stat(gdb).st_mode | stat.S_IEXEC)
+        session = os.path.join(workdir, 'gdb-vim.json')
+        with open(session, 'w') as conf:
+            json.dump({'variables': {'target': 'ab'},
+                       'modes': {'code': {},
+                                 'debug': {'setup': ['file {target}'], 'teardown': []}},
+                       'breakpoints': {SOURCE: [12]}}, conf)
+
+        vim = VimPeer(workdir, scenario, options)
+        try:
+            vim.send('session', 'load', session)
+            vim.pump(quiet)
+            vim.send('mode', 'debug')
+            vim.pump(quiet)
+            latencies, ui_latencies, sizes, commands = [], [], [], []
+            for i in range(warmup + steps):
+                size, count = vim.bytes, vim.commands()
+                start = vim.last_ui = time.time()
+                vim.send('exec', 'next')
+                last = vim.pump(quiet)
+                if i < warmup:
+                    continue
+                latencies.append(((last or start) - start) * 1000)
+                ui_latencies.append((vim.last_ui - start) * 1000)
+                sizes.append(vim.bytes - size)
+                commands.append(vim.commands() - count)
+            errors = vim.errors()
+            if errors:
+                raise BenchmarkError(errors[0].splitlines()[-1])
+            if not any(commands):
+                raise BenchmarkError('no MI command was issued (is pygdbmi 0.9 installed?)')
+        finally:
+            vim.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'p50_ms': percentile(latencies, 0.5),
+        'p99_ms': percentile(latencies, 0.99),
+        'ui_p50_ms': percentile(ui_latencies, 0.5),
+        'ui_p99_ms': percentile(ui_latencies, 0.99),
+        'bytes_per_step': sum(sizes) / len(sizes),
+        'commands_per_step': sum(commands) / len(commands),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='among: {} (default: all)'.format(', '.join(sorted(SCENARIOS))))
+    parser.add_argument('--steps', type=int, default=30, help='measured steps per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='steps run before measuring')
+    parser.add_argument('--quiet', type=float, default=0.25,
+                        help='seconds of silence that end a step')
+    parser.add_argument('--debounce', type=int, default=0,
+                        help='value of g:gdb#refresh#debounce, in milliseconds')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to FILE')
+    args = parser.parse_args()
+
+    names = args.scenarios or sorted(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error('unknown scenario: {}'.format(name))
+    options = {'refresh#debounce': args.debounce}
+
+    results = {}
+    print('{:<14} {:>9} {:>9} {:>9} {:>9} {:>12} {:>10}'.format(
+        'scenario', 'p50 ms', 'p99 ms', 'ui p50', 'ui p99', 'bytes/step', 'MI/step'))
+    failed = False
+    for name in names:
+        try:
+            res = run_scenario(SCENARIOS[name], args.steps, args.warmup, args.quiet, options)
+        except BenchmarkError as e:
+            print('{:<14} FAILED: {}'.format(name, e))
+            failed = True
+            continue
+        results[name] = dict(res, scenario=SCENARIOS[name])
+        print('{:<14} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>12.0f} {:>10.1f}'.format(
+            name, res['p50_ms'], res['p99_ms'], res['ui_p50_ms'], res['ui_p99_ms'],
+            res['bytes_per_step'],
+            res['commands_per_step']))
+        sys.stdout.flush()
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=4, sort_keys=True)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+""" A stand-in for `gdb --interpreter=mi3`, answering the MI commands issued by
+    the gdb.vim server with canned records. The inferior is fake: every
+    execution command moves it one line forward, and stops it again.
+
+    The shape of the fake program is read from the JSON object in the
+    GDB_VIM_BENCH_SCENARIO environment variable:
+        depth       frames of the stack of every thread (default 1)
+        threads     number of threads (default 1)
+        locals      number of locals in every frame (default 2)
+        changed     number of locals changed by every step (default 1)
+        output      lines printed by the inferior at every step (default 0)
+    Every command received is appended to the file named by GDB_VIM_BENCH_LOG,
+    if set.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+import re
+import signal
+import sys
+
+SOURCE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'ab.c')
+
+
+class FakeGdb:
+
+    def __init__(self, scenario):
+        self.depth = scenario.get('depth', 1)
+        self.threads = scenario.get('threads', 1)
+        self.locals = scenario.get('locals', 2)
+        self.changed = scenario.get('changed', 1)
+        self.output = scenario.get('output', 0)
+        self.line = 10
+        self.steps = 0
+        self.bp_number = 0
+        self.var_number = 0
+        self.current = 1
+        self.handlers = [
+            ('-stack-list-frames', self.stack_list_frames),
+            ('-stack-info-depth', self.stack_info_depth),
+            ('-stack-info-frame', lambda args: 'frame=' + self.frame(self.current, 0)),
+            ('-stack-list-variables', self.stack_list_variables),
+            ('-thread-list-ids', self.thread_list_ids),
+            ('-thread-info', self.thread_info),
+            ('-thread-select', self.thread_select),
+            ('-var-create', self.var_create),
+            ('-var-update', self.var_update),
+            ('-data-list-register-names', self.register_names),
+            ('-data-list-changed-registers', lambda args: 'changed-registers=["0","16"]'),
+            ('-data-list-register-values', self.register_values),
+            ('-data-disassemble', self.disassemble),
+            ('-break-insert', self.break_insert),
+        ]
+
+    @staticmethod
+    def write(*records):
+        sys.stdout.write(''.join(record + '\n' for record in records))
+        sys.stdout.flush()
+
+    def frame(self, tid, level):
+        line = self.line if level == 0 else 100 + level % 50
+        func = 'main' if level == self.depth - 1 else 'f{}'.format(level)
+        return ('{{level="{}",addr="{:#x}",func="{}",file="ab.c",fullname="{}",'
+                'line="{}",arch="i386:x86-64"}}').format(
+                    level, 0x401000 + 16 * line + tid, func, SOURCE, line)
+
+    def stack_list_frames(self, args):
+        numbers = [int(arg) for arg in args if arg.isdigit()]
+        low, high = numbers[-2:] if len(numbers) >= 2 else (0, self.depth - 1)
+        tid = int(args[args.index('--thread') + 1]) if '--thread' in args else self.current
+        frames = ('frame=' + self.frame(tid, level)
+                  for level in range(low, min(high + 1, self.depth)))
+        return 'stack=[{}]'.format(','.join(frames))
+
+    def stack_info_depth(self, args):
+        limit = [int(arg) for arg in args if arg.isdigit()]
+        return 'depth="{}"'.format(min([self.depth] + limit[-1:]))
+
+    def stack_list_variables(self, args):
+        return 'variables=[{}]'.format(','.join(
+            '{{name="v{}"}}'.format(i) for i in range(self.locals)))
+
+    def thread(self, tid):
+        return '{{id="{}",target-id="Thread 0x7ffff{:05x} (LWP {})",name="worker",' \
+               'frame={},state="stopped",core="0"}}'.format(tid, tid, 1000 + tid,
+                                                            self.frame(tid, 0))
+
+    def thread_list_ids(self, args):
+        ids = ','.join('thread-id="{}"'.format(tid) for tid in range(self.threads, 0, -1))
+        return 'thread-ids={{{}}},current-thread-id="{}",number-of-threads="{}"'.format(
+            ids, self.current, self.threads)
+
+    def thread_info(self, args):
+        tids = [int(args[0])] if args else range(1, self.threads + 1)
+        return 'threads=[{}],current-thread-id="{}"'.format(
+            ','.join(self.thread(tid) for tid in tids), self.current)
+
+    def thread_select(self, args):
+        self.current = int(args[0])
+        return 'new-thread-id="{}",frame={}'.format(self.current, self.frame(self.current, 0))
+
+    def var_create(self, args):
+        self.var_number += 1
+        return 'name="var{}",numchild="0",value="{}",type="int",has_more="0"'.format(
+            self.var_number, self.steps)
+
+    def var_update(self, args):
+        changes = ('{{name="var{}",value="{}",in_scope="true",type_changed="false",'
+                   'has_more="0"}}'.format(i, self.steps)
+                   for i in range(1, min(self.changed, self.var_number) + 1))
+        return 'changelist=[{}]'.format(','.join(changes))
+
+    @staticmethod
+    def register_names(args):
+        return 'register-names=[{}]'.format(','.join(
+            '"r{}"'.format(i) for i in range(24)))
+
+    def register_values(self, args):
+        numbers = args[1:] or [str(i) for i in range(24)]
+        return 'register-values=[{}]'.format(','.join(
+            '{{number="{}",value="{:#x}"}}'.format(n, self.steps) for n in numbers))
+
+    @staticmethod
+    def disassemble(args):
+        start, end = [int(arg, 16) for arg in args if arg.startswith('0x')]
+        return 'asm_insns=[{}]'.format(','.join(
+            '{{address="{:#x}",func-name="main",offset="{}",inst="nop"}}'.format(
+                addr, addr - 0x401000) for addr in range(start, end, 4)))
+
+    def break_insert(self, args):
+        self.bp_number += 1
+        file, line = args[-1].strip('"').rsplit(':', 1)
+        return ('bkpt={{number="{}",type="breakpoint",disp="keep",enabled="y",'
+                'addr="{:#x}",func="main",file="{}",fullname="{}",line="{}",'
+                'times="0",original-location="{}:{}"}}').format(
+                    self.bp_number, 0x401000 + 16 * int(line), os.path.basename(file),
+                    SOURCE, line, file, line)
+
+    def step(self, token):
+        self.steps += 1
+        self.line = 10 + self.steps % 20
+        records = [token + '^running', '*running,thread-id="all"', '(gdb)']
+        records += ['output line {} of step {}'.format(i, self.steps)
+                    for i in range(self.output)]
+        records.append('*stopped,reason="end-stepping-range",frame={},thread-id="{}",'
+                       'stopped-threads="all"'.format(self.frame(self.current, 0),
+                                                      self.current))
+        return records
+
+    def handle(self, token, command):
+        words = command.split()
+        if not words:
+            return [token + '^done']
+        if words[0] in ('next', 'step', 'continue', 'run', 'until', 'finish') \
+                or words[0].startswith('-exec-'):
+            return self.step(token)
+        for prefix, handler in self.handlers:
+            if words[0] == prefix:
+                return [token + '^done,' + handler(words[1:])]
+        if words[0].startswith('-'):
+            return [token + '^done']
+        return ['~"{}\\n"'.format(command.replace('\\', '\\\\').replace('"', '\\"')),
+                token + '^done']
+
+    def run(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # nothing runs, nothing to interrupt
+        log = os.environ.get('GDB_VIM_BENCH_LOG')
+        log = open(log, 'a') if log else None
+        self.write('(gdb)')
+        for line in sys.stdin:
+            match = re.match(r'(\d*)(.*)', line.rstrip('\n'))
+            token, command = match.groups()
+            if log is not None:
+                log.write(command + '\n')
+                log.flush()
+            if command.strip() in ('-gdb-exit', 'quit'):
+                self.write(token + '^exit')
+                break
+            self.write(*(self.handle(token, command) + ['(gdb)']))
+
+
+if __name__ == '__main__':
+    FakeGdb(json.loads(os.environ.get('GDB_VIM_BENCH_SCENARIO') or '{}')).run()